@@ -0,0 +1,49 @@
+'''Synthetic data, timing and the command line shared by the benchmarks'''
+import os
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from etl.data_import import ImportData
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_DATA = os.path.join(THIS_DIR, '..', 'tests', 'test_data', 'ticket') + '/'
+
+
+def synthesize_tickets(rows, seed=0):
+    '''rows seat rows resampled from the test extracts, spread over ten seasons'''
+    sample = ImportData().send_data('ticket', fys=[19, 20], path=TEST_DATA)
+    rng = np.random.default_rng(seed)
+    data = sample.iloc[rng.integers(0, len(sample), rows)].reset_index(drop=True)
+    shift = pd.to_timedelta(rng.integers(0, 10, rows) * 364, unit='D')
+    data['perf_dt'] = data['perf_dt'] - shift
+    return data
+
+
+def timed(func, *args):
+    '''result of func(*args) and the seconds it took'''
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def traced(func, *args):
+    '''result of func(*args), its peak traced memory in bytes and seconds
+
+    numpy and pandas report their buffers to tracemalloc
+    '''
+    tracemalloc.start()
+    result, elapsed = timed(func, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def run(main, doc, rows=1000000):
+    '''Calls main(rows) with --rows from the command line'''
+    parser = argparse.ArgumentParser(description=doc.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=rows)
+    main(parser.parse_args().rows)
@@ -0,0 +1,57 @@
+'''Peak memory of the returning singles filter chain, copying against masks
+
+The copying chain is the filter layer before masks (a defensive copy and a
+reset_index per filter). The mask chain combines the masks and materializes
+once with filter.select. Peaks are traced with tracemalloc on the
+synthetic ticket set.
+
+usage: python -m benchmarks.filter_memory --rows 1000000
+'''
+import pandas as pd
+
+from etl import filter
+from etl.data_prep import PrepTicketData
+from benchmarks.common import synthesize_tickets, traced, run
+
+SERIES = ['Classics', 'Pops', 'Summer']
+
+
+def copying_chain(data, to_date):
+    def copy_filter(data, mask_func, **kwargs):
+        data = data.copy()
+        return data.loc[mask_func(data, **kwargs)].reset_index(drop=True)
+
+    data = data.copy()
+    data = copy_filter(data, filter.series_mask, series=SERIES)
+    data = copy_filter(data, filter.non_subs_mask)
+    data = copy_filter(data, filter.paid_mask, column='paid_amt')
+    data = copy_filter(data, filter.before_date_mask, col='perf_dt', to_date=to_date)
+    return data[['summary_cust_id', 'perf_dt']].reset_index(drop=True)
+
+
+def mask_chain(data, to_date):
+    in_series = filter.series_mask(data, SERIES)
+    return filter.select(data, in_series,
+        filter.non_subs_mask(data, within=in_series),
+        filter.paid_mask(data, 'paid_amt'),
+        filter.before_date_mask(data, 'perf_dt', to_date),
+        columns=['summary_cust_id', 'perf_dt'])
+
+
+def main(rows):
+    data = PrepTicketData().prepare_chunk(synthesize_tickets(rows), full=False)
+    to_date = data['perf_dt'].quantile(0.75)
+    size = data.memory_usage(index=True, deep=False).sum()
+    print(f'{len(data):,} seat rows, {size / 2**20:,.0f} MB (shallow)')
+
+    expected, copy_peak, copy_time = traced(copying_chain, data, to_date)
+    result, mask_peak, mask_time = traced(mask_chain, data, to_date)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+    print(f'copying chain: peak {copy_peak / 2**20:8,.0f} MB in {copy_time:6.2f}s')
+    print(f'mask chain:    peak {mask_peak / 2**20:8,.0f} MB in {mask_time:6.2f}s')
+
+
+if __name__ == '__main__':
+    run(main, __doc__)
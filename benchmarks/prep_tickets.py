@@ -0,0 +1,41 @@
+'''Benchmarks ticket preparation, row wise against the vectorized prep
+
+Times PrepTicketData.prepare_chunk against the original row wise prep
+(strftime / split / zone_mapper per row) on --rows synthetic seat rows and
+checks that the vectorized output matches.
+
+usage: python -m benchmarks.prep_tickets --rows 1000000
+'''
+import pandas as pd
+
+from etl.data_prep import PrepTicketData
+from etl.helpers import fy_dtype
+from etl import transform
+from benchmarks.common import synthesize_tickets, timed, run
+
+
+def prepare_row_wise(data):
+    '''The ticket prep before vectorization, kept as the reference'''
+    data['dow'] = data['perf_dt'].transform(lambda x: x.strftime("%A"))
+    data['series'] = data['season_desc'].transform(lambda x: x.split(" ")[-1])
+    data['fy'] = data['perf_dt'].map(transform.convert_to_fy)
+    data['price_zone'] = data['zone_desc'].map(PrepTicketData.zone_mapper)
+    return data
+
+
+def main(rows):
+    data = synthesize_tickets(rows)
+    print(f'{len(data):,} seat rows')
+
+    expected, row_wise = timed(prepare_row_wise, data.copy())
+    result, vectorized = timed(PrepTicketData().prepare_chunk, data.copy(), False)
+
+    pd.testing.assert_frame_equal(result, expected.astype({'fy': fy_dtype}))
+
+    print(f'row wise:   {row_wise:8.2f}s')
+    print(f'vectorized: {vectorized:8.2f}s')
+    print(f'speedup:    {row_wise / vectorized:8.1f}x')
+
+
+if __name__ == '__main__':
+    run(main, __doc__)
@@ -1,4 +1,7 @@
+import pandas as pd
+
 from .decorators import build_operator
+from .cache import FrameCache
 
 def basic_aggregator(data, grp_by, col_to_agg, method, new_col_names=None):
     '''aggregates a single column and method
@@ -42,6 +45,122 @@ def complex_aggregator(data, grp_by, aggregator, new_col_names=None):
 
     return aggregated
 
+def latest_aggregator(data, grp_by, cols, order_by, new_col_names=None):
+    '''The most recent value of cols per grp_by value, ex. the current
+    solicitor of each donor
+
+    The most recent row of a group has the greatest order_by (the last of
+    them on ties, rows missing order_by only when no other). One stable sort
+    and a dedup, no per row Python. Rows missing grp_by are skipped.
+    Results are cached per frame and arguments while the frame is kept
+    and its grp_by, order_by and cols columns are unchanged (see
+    etl.cache.FrameCache)
+
+    example:
+    latest_aggregator(donor, 'summary_cust_id', ['ps_sol', 'channel_desc'], 'trn_dt')
+    '''
+    cols = cols if isinstance(cols, list) else [cols]
+    key = (grp_by, tuple(cols), order_by)
+    latest = frame_latest.get(data, key=key)
+
+    if latest is None:
+        latest = data[[grp_by, order_by] + cols]
+        latest = latest.loc[latest[grp_by].notnull()]
+        latest = latest.sort_values(order_by, kind='mergesort', na_position='first')
+        latest = latest.drop_duplicates(grp_by, keep='last')
+        latest = latest.sort_values(grp_by)[[grp_by] + cols].reset_index(drop=True)
+        frame_latest.put(data, latest, columns=[grp_by, order_by] + cols, key=key)
+
+    aggregated = latest.copy()
+
+    if new_col_names:
+        aggregated.columns = new_col_names
+
+    return aggregated
+
+
+# latest_aggregator results of the frames aggregated in this process
+frame_latest = FrameCache()
+
+
+def chunked_aggregator(chunks, grp_by, aggregator, new_col_names=None):
+    '''aggregates an iterable of dataframe chunks (see PSData.stream_data)
+
+    Only partial results are kept between chunks, so memory is bounded by the
+    number of groups rather than the number of rows. The result matches
+    complex_aggregator run on the concatenated chunks.
+    Supported methods: 'sum', 'count', 'min', 'max', 'mean' and 'nunique'
+
+    example:
+    chunks = ticket.stream_data(fys=[19, 20])
+    aggregator = {
+        'paid_amt': ['sum', 'mean'],
+        'perf_dt': 'nunique'
+    }
+    chunked_aggregator(chunks, 'summary_cust_id', aggregator)
+    '''
+    grp_by = grp_by if isinstance(grp_by, list) else [grp_by]
+    methods = [(col, method) for col, col_methods in aggregator.items()
+        for method in (col_methods if isinstance(col_methods, list) else [col_methods])]
+
+    partial_parts = {
+        'sum': ['sum'], 'count': ['count'], 'mean': ['sum', 'count'],
+        'min': ['min'], 'max': ['max'], 'nunique': []
+    }
+    combine = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+    parts = {}
+    for col, method in methods:
+        for part in partial_parts[method]:
+            parts.setdefault(col, [])
+            if part not in parts[col]:
+                parts[col].append(part)
+
+    distinct_cols = [col for col, method in methods if method == 'nunique']
+    partials = None
+    distinct = {col: None for col in distinct_cols}
+    empty = True
+
+    for chunk in chunks:
+        empty = False
+        if parts:
+            partial = chunk.groupby(grp_by).agg(parts)
+            if partials is not None:
+                partial = pd.concat([partials, partial]).groupby(level=grp_by).agg({
+                    key: combine[key[1]] for key in partial.columns
+                })
+            partials = partial
+
+        for col in distinct_cols:
+            pairs = chunk[grp_by + [col]].drop_duplicates()
+            if distinct[col] is not None:
+                pairs = pd.concat([distinct[col], pairs]).drop_duplicates()
+            distinct[col] = pairs
+
+    results = {}
+    for col, method in methods:
+        if empty:
+            index = pd.MultiIndex.from_arrays([[] for _ in grp_by], names=grp_by)
+            results[(col, method)] = pd.Series([], index=index, dtype=float)
+        elif method == 'nunique':
+            results[(col, method)] = distinct[col].groupby(grp_by)[col].nunique()
+        elif method == 'mean':
+            results[(col, method)] = partials[(col, 'sum')] / partials[(col, 'count')]
+        else:
+            results[(col, method)] = partials[(col, method)]
+
+    aggregated = pd.DataFrame(results)
+    if all(not isinstance(col_methods, list) for col_methods in aggregator.values()):
+        aggregated.columns = [col for col, _ in aggregated.columns]
+    aggregated.index.names = grp_by
+    aggregated = aggregated.reset_index()
+
+    if new_col_names:
+        aggregated.columns = new_col_names
+
+    return aggregated
+
+
 @build_operator
 def threshold_aggregator(data, threshold, greater_than=True, equal_to=True,
                         additional_agg=None):
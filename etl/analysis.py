@@ -2,14 +2,31 @@ import math
 import pandas as pd
 import numpy as np
 from .helpers import donor_tier_mapper
-from . import filter, aggregator, transform
+from . import filter, aggregator, transform, segmentation
+from .tiers import tier_bins
 from .plot import PlotFactory
+from .summary import get_summary
 
 class TierAnalysis:
+    # donor columns used, ex. donor.get_data(fys=13, columns=TierAnalysis.columns,
+    #     select_fys=TierAnalysis.donor_fys(20))
+    columns = ['summary_cust_id', 'fy', 'campaign', 'gift_plus_pledge']
+
+    @staticmethod
+    def donor_fys(fy):
+        '''fiscal years of donor data execute uses for fy'''
+        return [fy - 1, fy]
+
+    # donor_tier of customers without a gift in a fy, see execute_history
+    no_tier = 0
+
     def __init__(self):
         self.plot = PlotFactory('tier_analysis').plotter()
         self.tier_counts = None
         self.tier_revenue = None
+        self.history_counts = None
+        self.history_revenue = None
+        self.transitions = None
 
     def execute(self, data, fy, mapper=None):
         """This function will calculate the number of retained customers across a\
@@ -30,14 +47,21 @@ class TierAnalysis:
         if mapper is None:
             mapper = donor_tier_mapper
 
-        data = filter.filter_fys(data, [fy-1, fy])
+        data = filter.filter_fys(data, self.donor_fys(fy))
         filtered = filter.filter_individual_giving(data)
         aggregate = aggregator.basic_aggregator(filtered, ['summary_cust_id','fy'],
             'gift_plus_pledge', 'sum', ['customer_id','fy', 'transaction_amount'])
 
         paid_only = filter.filter_paid_only(aggregate, 'transaction_amount')
-        donor_tier = self.categorize_donors(paid_only, mapper)
-        paid_donor_merge = paid_only.join(pd.Series(donor_tier, name='donor_tier'))
+        donor_tier = pd.Series(self.categorize_donors(paid_only, mapper),
+            index=paid_only.index, name='donor_tier')
+
+        if donor_tier.isnull().any():
+            print(f'tier analysis: dropped {donor_tier.isnull().sum()} customers outside of '
+                  f'the tiers, ex. {list(paid_only.loc[donor_tier.isnull(), "transaction_amount"][:5])}')
+            paid_only, donor_tier = paid_only.loc[donor_tier.notnull()], donor_tier.dropna()
+
+        paid_donor_merge = paid_only.join(donor_tier.astype('int64'))
 
         cur, py, combined = self.cur_py_combo_breakout(paid_donor_merge, fy)
 
@@ -61,6 +85,82 @@ class TierAnalysis:
         self.plot.plot_tier_revenue(self.tier_revenue)
         return agg
 
+    def execute_history(self, data, fys=None, mapper=None):
+        '''Tier migration of every consecutive pair of fiscal years in one pass
+
+        Donor totals are aggregated per (customer, fy) and tiered once, then
+        each customer and fy is paired with the prior fy. Only fys whose
+        prior fy is in data are reported.
+
+        args:
+            fys -> fiscal years to use, None for every fy in data
+            mapper -> tier mapper, default: donor_tier_mapper
+
+        sets:
+            history_counts -> customers per fy, donor_tier and classification
+                              (tier_counts of execute for every fy)
+            history_revenue -> transaction_amount per fy and donor_tier
+                               (tier_revenue of execute for every fy)
+            transitions -> customers per (fy, py_donor_tier) row and
+                           donor_tier column. Tier no_tier (0) is no gift that
+                           year: row 0 is new donors, column 0 lost donors
+
+        returns customers, revenue and prior year revenue per fy and
+        classification (new, upgrade, downgrade, retained, lost)
+        '''
+        if mapper is None:
+            mapper = donor_tier_mapper
+
+        if fys is not None:
+            data = filter.filter_fys(data, fys)
+
+        filtered = filter.filter_individual_giving(data)
+        aggregate = aggregator.basic_aggregator(filtered, ['summary_cust_id', 'fy'],
+            'gift_plus_pledge', 'sum', ['customer_id', 'fy', 'transaction_amount'])
+
+        paid_only = filter.filter_paid_only(aggregate, 'transaction_amount')
+        paid_only = paid_only.assign(donor_tier=self.categorize_donors(paid_only, mapper))
+        tiered = paid_only.loc[paid_only['donor_tier'].notnull()]\
+            .astype({'fy': 'int64', 'donor_tier': 'int64'})
+
+        prior = tiered.assign(fy=tiered['fy'] + 1)
+        prior.columns = ['customer_id', 'fy', 'py_amount', 'py_donor_tier']
+
+        pairs = tiered.merge(prior, on=['customer_id', 'fy'], how='outer')
+        reported = [fy for fy in tiered['fy'].unique() if fy - 1 in set(tiered['fy'])]
+        pairs = pairs.loc[pairs['fy'].isin(reported)].reset_index(drop=True)
+        pairs[['transaction_amount', 'py_amount']] = \
+            pairs[['transaction_amount', 'py_amount']].fillna(0)
+        pairs[['donor_tier', 'py_donor_tier']] = \
+            pairs[['donor_tier', 'py_donor_tier']].fillna(self.no_tier).astype('int64')
+
+        comparison = pairs['donor_tier'] - pairs['py_donor_tier']
+        pairs['classification'] = np.select(
+            [pairs['donor_tier'] == self.no_tier, pairs['py_donor_tier'] == self.no_tier,
+             comparison > 0, comparison < 0],
+            ['lost', 'new', 'upgrade', 'downgrade'], 'retained')
+
+        current = pairs.loc[pairs['donor_tier'] != self.no_tier]
+        self.history_counts = aggregator.basic_aggregator(current,
+            ['fy', 'donor_tier', 'classification'], 'customer_id', 'count',
+            ['fy', 'donor_tier', 'classification', 'count'])
+        self.history_revenue = aggregator.basic_aggregator(current, ['fy', 'donor_tier'],
+            'transaction_amount', 'sum')
+        self.transitions = pd.crosstab([pairs['fy'], pairs['py_donor_tier']],
+            pairs['donor_tier'])
+
+        return aggregator.complex_aggregator(pairs, ['fy', 'classification'], {
+            'customer_id': 'count',
+            'transaction_amount': 'sum',
+            'py_amount': 'sum'
+        }, ['fy', 'classification', 'count', 'revenue', 'py_revenue'])
+
+    def transition_matrix(self, fy):
+        '''Customers moving from each py_donor_tier (rows) to each donor_tier
+        (columns) in fy, see execute_history
+        '''
+        return self.transitions.loc[fy]
+
 
     @staticmethod
     def cur_py_combo_breakout(data, fy):
@@ -75,15 +175,9 @@ class TierAnalysis:
 
 
     @staticmethod
-    def categorize_donors(data, mapper):
-        donor_tier = []
-
-        for amount in data['transaction_amount']:
-            donor_tier.append(
-                [int(key) for key,val in mapper.items() if val[0] <= round(amount,2) <= val[1]][0]
-            )
-
-        return donor_tier
+    def categorize_donors(data, mapper, gaps='lower'):
+        '''Tier of each transaction_amount, see tiers.TierBins for gaps'''
+        return tier_bins(mapper, gaps=gaps).assign(data['transaction_amount'])
 
 
     @staticmethod
@@ -121,31 +215,45 @@ class PreConcertSegmentation:
     '''
     concert_dates --
     '''
+    # columns used, ex. ticket.get_data(fys=20, columns=PreConcertSegmentation.ticket_columns)
+    ticket_columns = ['summary_cust_id', 'summary_cust_name', 'perf_dt', 'paid_amt',
+                      'section', 'row', 'seat', 'price_type_group', 'fy']
+    donor_columns = ['summary_cust_id', 'fy', 'gift_plus_pledge', 'trn_dt', 'ps_sol']
 
-    def __init__(self, ticket_data, donor_data, fy, concert_dates):
-        self.raw_tdata = ticket_data.copy()
-        self.raw_ddata = donor_data.copy()
+    @staticmethod
+    def donor_fys(fy):
+        '''fiscal years of donor data used for fy (5 year history), ex.
+        donor.get_data(fys=13, select_fys=PreConcertSegmentation.donor_fys(20))
+        '''
+        return list(range(fy - 4, fy + 1))
+
+    def __init__(self, ticket_data, donor_data, fy, concert_dates, breakpoints='midpoint'):
+        '''breakpoints -> 'midpoint' or 'quantile', see segmentation.BreakpointFactory'''
+        # not copied (never modified here) so indexes built by PSData.build_index apply
+        self.raw_tdata = ticket_data
+        self.raw_ddata = donor_data
         self.fy = fy
         self.concert_dates = concert_dates
+        self.breakpoints = breakpoints
 
     def execute(self):
-        tdata = filter.filter_paid_only(self.raw_tdata, 'paid_amt')
+        summary = get_summary(self.raw_tdata)
         subs = self.get_current_subs()
         donor_hist = self.donor_hist()
 
-        segment_data = self.prep_segmentation_data(tdata)
-        min_t, low_t, avg_t, high_t, max_t = self.segmentation_breakouts(segment_data, 'transactions')
-        min_p, low_p, avg_p, high_p, max_p = self.segmentation_breakouts(segment_data, 'avg_paid')
-
-        segment_data = self.get_segmentation(segment_data, self.segmentation_algo,
-                              low_t, avg_t, high_t, low_p, avg_p, high_p)
+        if summary is None:
+            tdata = filter.filter_paid_only(self.raw_tdata, 'paid_amt')
+            segment_data = self.prep_segmentation_data(tdata)
+        else:
+            segment_data = summary.segmentation_data()
+        segment_data = segmentation.segment_customers(segment_data, self.breakpoints)
 
         segment_data = segment_data.merge(subs, on='summary_cust_id', how='left')
         segment_data = segment_data.merge(donor_hist, on='summary_cust_id', how='left')
         segment_data = segment_data.fillna(0)
         segment_data = segment_data[['summary_cust_id', 'segment', 'subs', 'donor_5yr_history']]
 
-        concerts = (self.get_concert_by_date(date) for date in self.concert_dates)
+        concerts = self.get_concerts(self.concert_dates)
         solicitor = self.get_solicitor_info()
 
         for concert, date in zip(concerts, self.concert_dates):
@@ -159,10 +267,9 @@ class PreConcertSegmentation:
 
     @staticmethod
     def prep_segmentation_data(data):
-        data = data.copy()
         data = data.groupby(['summary_cust_id']).agg({
             'perf_dt': 'nunique',
-            'paid_amt': lambda x: sum(x) / len(x)
+            'paid_amt': 'mean'
         }).reset_index()
 
         data.columns = ['summary_cust_id', 'transactions', 'avg_paid']
@@ -205,49 +312,60 @@ class PreConcertSegmentation:
 
 
     def get_current_subs(self):
-        data = self.raw_tdata.copy()
-        data = filter.filter_fys(data=data, fys=[self.fy])
-        data = filter.filter_subs(data)
-        current_subs = data['summary_cust_id'].drop_duplicates()
+        summary = get_summary(self.raw_tdata)
+
+        if summary is None:
+            data = self.raw_tdata
+            in_fy = filter.fys_mask(data=data, fys=[self.fy])
+            data = filter.select(data, in_fy, filter.subs_mask(data, within=in_fy),
+                columns=['summary_cust_id'])
+            current_subs = data['summary_cust_id'].drop_duplicates()
+        else:
+            current_subs = summary.subscribers(self.fy)
+
         current_subs = pd.DataFrame(current_subs).reset_index(drop=True)
         current_subs['subs'] = 'subscriber'
         return current_subs
 
     def donor_hist(self):
-        data = self.raw_ddata.copy()
-        data = filter.filter_fys(data=data, fys=[fy for fy in range(self.fy-4, self.fy+1)])
+        data = self.raw_ddata
+        data = filter.select(data,
+            filter.fys_mask(data=data, fys=self.donor_fys(self.fy)),
+            columns=['summary_cust_id', 'gift_plus_pledge'])
         data = data.groupby('summary_cust_id').agg({'gift_plus_pledge': 'sum'}).reset_index()
         data.columns = ['summary_cust_id', 'donor_5yr_history']
         return data
 
     def get_concert_by_date(self, date):
-        data = self.raw_tdata.copy()
-        data['perf_dt_date'] = data['perf_dt'].map(lambda x: x.strftime('%Y-%m-%d'))
-        mask = data['perf_dt_date'] == pd.to_datetime(date).strftime('%Y-%m-%d')
-        data = data.loc[mask]
-        return data
+        rows = filter.day_rows(self.raw_tdata, 'perf_dt', date)
+        return self.raw_tdata.iloc[rows]
+
+    def get_concerts(self, dates):
+        '''Ticket rows of each date, as get_concert_by_date, from one pass
+
+        The rows of every concert day are grouped (filter.day_groups) and
+        copied once, day after day, then each concert is a slice (no copy)
+        of that season frame
+        '''
+        order, slices = filter.day_groups(self.raw_tdata, 'perf_dt', dates)
+        season = self.raw_tdata.take(order)
+
+        for date in dates:
+            yield season.iloc[slices[pd.Timestamp(date).normalize()]]
 
     @staticmethod
     def setup_seating(concert_data):
         data = concert_data.copy()
-        data['seating'] = data['section'] + ' ' + data['row'] + ' ' + data['seat'].map(str)
+        data['seating'] = data['section'].astype(object) + ' ' +\
+            data['row'].astype(object) + ' ' + data['seat'].map(str)
         data = data[['summary_cust_id', 'summary_cust_name', 'seating']]
         return data
 
 
     def get_solicitor_info(self):
-        data = self.raw_ddata.copy()
-        data = data.sort_values('trn_dt', ascending=False)[['summary_cust_id', 'ps_sol']].reset_index(drop=True)
-
-        d = {}
-        for sid, pssol in zip(data['summary_cust_id'], data['ps_sol']):
-            if sid in d.keys():
-                pass
-            else:
-                d.update({sid: pssol})
-
-        solicitor = pd.DataFrame({'summary_cust_id': list(d.keys()), 'solicitor': list(d.values())})
-        return solicitor
+        '''ps_sol of the most recent donation of each customer'''
+        return aggregator.latest_aggregator(self.raw_ddata, 'summary_cust_id', 'ps_sol',
+            'trn_dt', ['summary_cust_id', 'solicitor'])
 
 class DonorWeekly:
     def __init__(self):
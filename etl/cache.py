@@ -0,0 +1,329 @@
+import os
+import zlib
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .helpers import cached_dtypes, date_columns
+from .exception import UnexpectedCacheFormat
+
+
+class WorkingCache:
+    '''Stores prepared (working) data on disk so it can be reused across runs
+
+    Entries are content addressed: the key covers the source files (path,
+    mtime and size), the fys/qtr requested, the full flag and the preparer
+    version, so a changed source file or preparer never returns stale data.
+    The least recently used entries are evicted once the cache directory
+    grows beyond max_bytes.
+
+    args:
+        directory -> folder the cache files are written to
+        format -> one of 'pickle', 'feather' or 'csv'
+        max_bytes -> disk budget for the directory, None for no limit
+    '''
+
+    def __init__(self, directory='cache', format='pickle', max_bytes=2 * 1024 ** 3):
+        self.strategy_map = {
+            'pickle': PickleCacheStrategy,
+            'feather': FeatherCacheStrategy,
+            'csv': CsvCacheStrategy
+        }
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.set_format(format)
+
+    def set_format(self, format):
+        try:
+            self.strategy = self.strategy_map[format]()
+        except KeyError:
+            options = list(self.strategy_map.keys())
+            raise UnexpectedCacheFormat(f'{format} must match one of: {options}')
+        self.format = format
+
+    @staticmethod
+    def build_key(type, full, version, files=(), fys=None, qtr=None, data=None,
+                  **options):
+        '''Builds the content address of a working data set
+
+        args:
+            files -> source files the raw data was imported from
+            data -> raw dataframe, hashed when the source files are unknown
+            options -> any other import option changing the raw data
+                       ex. compact=True
+        '''
+        if fys is not None:
+            fys = [str(fy) for fy in (fys if isinstance(fys, list) else [fys])]
+
+        parts = [type, bool(full), version, fys, qtr, sorted(options.items())]
+
+        for file in files:
+            stat = os.stat(file)
+            parts.append((os.path.abspath(file), stat.st_mtime_ns, stat.st_size))
+
+        if data is not None:
+            hashed = pd.util.hash_pandas_object(data, index=True).values
+            parts.append(hashlib.sha1(hashed.tobytes()).hexdigest())
+
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def file_for(self, type, key):
+        return os.path.join(self.directory,
+            f'{type}_{key[:20]}.{self.strategy.extension}')
+
+    def read(self, type, key):
+        '''Returns the cached data for type and key or None if it is not cached'''
+        file = self.file_for(type, key)
+
+        if not os.path.exists(file):
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        os.utime(file) # mark as most recently used
+        return self.strategy.read(file, type)
+
+    def write(self, type, key, data):
+        if not os.path.exists(self.directory):
+            os.mkdir(self.directory)
+
+        file = self.file_for(type, key)
+        self.strategy.write(data, file)
+        self.evict(keep=file)
+
+    def entries(self):
+        '''Cache files as (path, size, last used) sorted oldest first'''
+        if not os.path.exists(self.directory):
+            return []
+
+        entries = []
+        for name in os.listdir(self.directory):
+            file = os.path.join(self.directory, name)
+            if os.path.isfile(file):
+                stat = os.stat(file)
+                entries.append((file, stat.st_size, stat.st_mtime))
+
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+        '''Removes least recently used files until the directory fits max_bytes'''
+        if self.max_bytes is None:
+            return
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        for file, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if file == keep:
+                continue
+            os.remove(file)
+            total -= size
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        for file, _, _ in self.entries():
+            os.remove(file)
+
+
+class DatasetMemo:
+    '''Process wide, in memory LRU of imported source files
+
+    Entries are keyed by data type, file path, mtime, size and read arguments
+    (dtype, parse_dates, ...) so every fiscal year file is parsed once per
+    process, and overlapping fy lists reuse the years already loaded. Copies
+    are handed out so callers can't modify the memoized frames.
+
+    args:
+        max_bytes -> memory budget, least recently used entries are dropped
+                     once exceeded and files larger than it are not
+                     memoized. None for no limit
+    '''
+
+    def __init__(self, max_bytes=1024 ** 3):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'oversized': 0}
+        self.lock = threading.Lock() # imports may run in a thread pool
+
+    @staticmethod
+    def build_key(type, file, **read_args):
+        stat = os.stat(file)
+        return (type, os.path.abspath(file), stat.st_mtime_ns, stat.st_size,
+            repr(sorted(read_args.items())))
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.stats['misses'] += 1
+                return None
+
+            self.stats['hits'] += 1
+            self.entries.move_to_end(key)
+            data, _ = self.entries[key]
+
+        return data.copy()
+
+    def put(self, key, data):
+        '''Memoizes data, unless it alone exceeds max_bytes
+
+        returns True if data was memoized
+        '''
+        nbytes = int(data.memory_usage(index=True, deep=True).sum())
+
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                self.stats['oversized'] += 1
+                return False
+
+            self.entries[key] = (data, nbytes)
+            self.nbytes += nbytes
+
+            while self.max_bytes is not None and self.nbytes > self.max_bytes \
+                    and len(self.entries) > 1:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+                self.stats['evictions'] += 1
+
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+class FrameCache:
+    '''Values derived from in memory dataframes (indexes, summaries)
+
+    Frames are unhashable, so entries are keyed by id and dropped when the
+    frame is garbage collected. An entry only applies to the very frame it
+    was built from, while the columns it was derived from are unchanged.
+
+    The contents of those columns are fingerprinted on put (see
+    column_fingerprint). A get first checks that data[col] is still the
+    column object seen last, which holds until pandas drops the column from
+    the frame's item cache on any edit (sorts, assignments, .loc writes).
+    Only then are the contents fingerprinted again, so lookups are O(1)
+    and a full pass is paid once per edit, not once per lookup. Writes
+    that bypass the frame (into a Series or .values) are not seen.
+    '''
+
+    def __init__(self):
+        self.entries = {}
+
+    def put(self, data, value, columns=None, key=None):
+        '''Caches value for data
+
+        args:
+            columns -> columns value was derived from, None for all
+            key -> name of the value, a frame can hold several
+        '''
+        frame_id = id(data)
+        frame = self.entries.get(frame_id)
+
+        if frame is None or frame[0]() is not data:
+            frame = (weakref.ref(data, lambda _: self.entries.pop(frame_id, None)), {})
+            self.entries[frame_id] = frame
+
+        columns = data.columns if columns is None else columns
+        fingerprints = {col: [weakref.ref(data[col]), column_fingerprint(data[col])]
+            for col in columns}
+        frame[1][key] = (fingerprints, value)
+
+    def get(self, data, key=None):
+        frame = self.entries.get(id(data))
+
+        if frame is None or frame[0]() is not data or key not in frame[1]:
+            return None
+
+        fingerprints, value = frame[1][key]
+        for col, checked in fingerprints.items():
+            if col not in data.columns:
+                del frame[1][key]
+                return None
+
+            series = data[col]
+            if checked[0]() is series:
+                continue
+
+            # the frame was edited since the last check
+            if column_fingerprint(series) != checked[1]:
+                del frame[1][key]
+                return None
+            checked[0] = weakref.ref(series)
+
+        return value
+
+
+def column_fingerprint(series):
+    '''Length, dtype and crc32 of the contents of a column
+
+    Numeric, boolean and datetime columns are checksummed in place,
+    other columns (strings, categoricals, nullable integers) through
+    pd.util.hash_pandas_object
+    '''
+    values = series.values
+
+    if not isinstance(values, np.ndarray) or values.dtype == object:
+        values = pd.util.hash_pandas_object(series, index=False).values
+
+    values = np.ascontiguousarray(values)
+    return len(series), str(series.dtype), zlib.crc32(values.view(np.uint8))
+
+
+class PickleCacheStrategy:
+    '''Binary cache, round trips every dtype (categoricals, datetimes) exactly'''
+    extension = 'pkl'
+
+    def write(self, data, file):
+        data.to_pickle(file)
+
+    def read(self, file, type):
+        return pd.read_pickle(file)
+
+
+class FeatherCacheStrategy:
+    '''Columnar binary cache, requires pyarrow to be installed'''
+    extension = 'feather'
+
+    def write(self, data, file):
+        data.reset_index(drop=True).to_feather(file)
+
+    def read(self, file, type):
+        return pd.read_feather(file)
+
+
+class CsvCacheStrategy:
+    '''Plain text cache, kept as an opt-in fallback
+
+    dtypes are not stored in the file so they are re-applied from
+    cached_dtypes and date_columns when read back
+    '''
+    extension = 'csv'
+
+    def write(self, data, file):
+        data.to_csv(file, index=False)
+
+    def read(self, file, type):
+        return pd.read_csv(file, dtype=cached_dtypes.get(type),
+            parse_dates=date_columns.get(type))
+
+
+# Process wide memo of raw files read by the import strategies
+dataset_memo = DatasetMemo()
+
+# Process wide cache used by the check_working_cache/cache_working_data
+# decorators. Use working_cache.set_format('csv') to fall back to csv files
+# and working_cache.max_bytes to change the disk budget.
+working_cache = WorkingCache()
@@ -1,7 +1,16 @@
+import os
+from functools import partial
+
+import numpy as np
 import pandas as pd
 
-from .helpers import ticketing_dtype, donor_dtype, date_columns
-from .decorators import check_fys_is_int
+from .helpers import (ticketing_dtype, donor_dtype, compact_ticketing_dtype,
+    compact_donor_dtype, date_columns, donor_date_format, fy_dtype)
+from .decorators import check_fys_is_int, memoize_import
+from .util import parallel_map
+from .cache import WorkingCache
+from .store import column_store
+from .data_prep import PrepDonorData
 from . import transform
 
 class ImportData:
@@ -9,17 +18,23 @@ class ImportData:
 
     args:
         type -> confirms the data type in question to use the matching strategy
+        workers -> parse multi fiscal year imports with a pool of this size
+        executor -> 'thread' or 'process' pool used when workers > 1
+        compact -> use the compact schema (categoricals, downcast integers)
+        columns -> only parse these columns from the source files
     '''
 
     def __init__(self):
         self.type_map = {
             'ticket': {
                 'strategy': TicketImportStrategy,
-                'dtype': ticketing_dtype
+                'dtype': ticketing_dtype,
+                'compact_dtype': compact_ticketing_dtype
             },
             'donor': {
                 'strategy': DonorImportStrategy,
-                'dtype': donor_dtype
+                'dtype': donor_dtype,
+                'compact_dtype': compact_donor_dtype
             },
             'subscriber': {
                 'strategy': SubscriberImportStrategy
@@ -32,72 +47,377 @@ class ImportData:
             }
         }
 
-    def send_data(self, type, fys, path, qtr=None):
+    def send_data(self, type, fys, path, qtr=None, workers=None, executor='thread',
+                  compact=False, columns=None, select_fys=None):
+        '''select_fys -> donor only, read these fiscal years of the extract'''
         data_type = self.type_map[type]
-        dtype = data_type.get('dtype')
+        dtype = self.get_dtype(type, compact)
         strategy = data_type['strategy']()
-        data = strategy.get_data(fys=fys, path=path, dtype=dtype, qtr=qtr)
+        options = {} if select_fys is None else {'select_fys': select_fys}
+        data = strategy.get_data(fys=fys, path=path, dtype=dtype, qtr=qtr,
+            workers=workers, executor=executor, columns=select_columns(columns),
+            **options)
         return data
 
+    def get_dtype(self, type, compact=False):
+        data_type = self.type_map[type]
+
+        if compact:
+            return data_type.get('compact_dtype', data_type.get('dtype'))
+
+        return data_type.get('dtype')
+
+    def describe_source(self, type, fys, path, qtr=None, compact=False, columns=None,
+                        select_fys=None):
+        '''Describes where send_data reads from, used to key the working cache'''
+        strategy = self.type_map[type]['strategy']()
+        files = strategy.source_files(fys=fys, path=path, qtr=qtr)
+        source = {'files': files, 'fys': fys, 'qtr': qtr, 'compact': compact,
+                  'columns': repr(select_columns(columns))}
+
+        if select_fys is not None:
+            source['select_fys'] = repr(select_fys)
+
+        return source
+
+    def describe_partitions(self, type, fys, path, qtr=None, compact=False, columns=None):
+        '''describe_source of each (fy, qtr) period send_data reads, in order'''
+        strategy = self.type_map[type]['strategy']()
+
+        if not hasattr(strategy, 'periods'):
+            raise Exception(f'{type} data is not partitioned by period')
+
+        return {(fy, q): self.describe_source(type=type, fys=fy, path=path, qtr=q,
+                    compact=compact, columns=columns)
+                for fy, q in strategy.periods(fys=fys, path=path, qtr=qtr)}
+
+    def stream_data(self, type, fys, path, chunksize, qtr=None, compact=False,
+                    columns=None):
+        '''Yields the data in chunks of chunksize rows instead of one frame'''
+        strategy = self.type_map[type]['strategy']()
+
+        if not hasattr(strategy, 'iter_data'):
+            raise Exception(f'{type} data can not be streamed')
+
+        return strategy.iter_data(fys=fys, path=path, dtype=self.get_dtype(type, compact),
+            chunksize=chunksize, columns=select_columns(columns))
+
+
+class ColumnSelector:
+    '''usecols for pd.read_csv, pushes a column projection down into the parser
+
+    Columns missing from a file (ex. derived columns like 'fy') are ignored,
+    and the repr is stable so projected reads are memoized separately.
+    '''
+
+    def __init__(self, columns):
+        self.columns = frozenset(columns)
+
+    def __call__(self, column):
+        return column in self.columns
+
+    def __repr__(self):
+        return f'ColumnSelector({sorted(self.columns)})'
+
+    def select(self, columns):
+        '''Keeps the given columns (ex. date columns) that are selected'''
+        return [col for col in columns if col in self.columns]
+
+
+def select_columns(columns):
+    if columns is None or isinstance(columns, ColumnSelector):
+        return columns
+    return ColumnSelector(columns)
+
+
+def parse_date_columns(type, columns=None):
+    '''date columns of type to parse, limited to the selected columns'''
+    dates = date_columns.get(type)
+    if columns is None or dates is None:
+        return dates
+    return columns.select(dates)
+
+
+@memoize_import
+def read_file(type, file, **kwargs):
+    '''Reads a single source file, memoized per process by etl.cache.dataset_memo'''
+    return pd.read_csv(file, **kwargs)
+
+
+def restore_categoricals(data, dtype):
+    '''pd.concat falls back to object when the categories differ between files'''
+    categories = {col: 'category' for col, kind in (dtype or {}).items()
+        if kind == 'category' and col in data.columns}
+    return data.astype(categories) if categories else data
+
 
 class TicketImportStrategy:
     '''Strategy for importing ticket data'''
+    default_path = '../../data/ticket/'
+
     @check_fys_is_int
-    def get_data(self, fys, path=None, dtype=None, qtr=None):
-        fp = path or '../../data/ticket/'
-        data_gen = (self.import_file(fy=fy, path=fp, dtype=dtype) for fy in fys)
+    def get_data(self, fys, path=None, dtype=None, qtr=None, workers=None,
+                 executor='thread', columns=None):
+        '''Imports and concatenates the fiscal year files in fys order
+
+        args:
+            workers -> if > 1, files are parsed concurrently in a pool
+            executor -> 'thread' or 'process'
+            columns -> ColumnSelector of the columns to parse, None for all
+        '''
+        fp = path or self.default_path
+        import_fy = partial(self.import_file, path=fp, dtype=dtype, columns=columns)
+        data_gen = parallel_map(import_fy, fys, workers=workers, executor=executor)
         data = pd.concat(data_gen, ignore_index=True)
-        return data
+        return restore_categoricals(data, dtype)
+
+    @check_fys_is_int
+    def iter_data(self, fys, chunksize, path=None, dtype=None, columns=None):
+        '''Yields chunks of at most chunksize rows, file by file in fys order
+
+        Chunks bypass the in memory dataset memo to keep memory bounded
+        '''
+        fp = path or self.default_path
+
+        for fy in fys:
+            reader = pd.read_csv(self.source_file(fy=fy, path=fp),
+                dtype=transform.read_dtype(dtype), skiprows=3, usecols=columns,
+                parse_dates=parse_date_columns('ticket', columns),
+                chunksize=chunksize)
+
+            for chunk in reader:
+                yield transform.narrow_integers(chunk, dtype, 'ticket')
+
+    @check_fys_is_int
+    def source_files(self, fys, path=None, qtr=None):
+        fp = path or self.default_path
+        return [self.source_file(fy=fy, path=fp) for fy in fys]
 
-    def import_file(self, fy, path, dtype=None):
-        file = path + f'fy{str(fy)}_all.csv'
-        df = pd.read_csv(file, dtype=dtype, skiprows=3, parse_dates=date_columns.get('ticket'))
-        return df
+    @staticmethod
+    def source_file(fy, path):
+        return path + f'fy{str(fy)}_all.csv'
+
+    def import_file(self, fy, path, dtype=None, columns=None):
+        file = self.source_file(fy=fy, path=path)
+        df = read_file('ticket', file, dtype=transform.read_dtype(dtype), skiprows=3,
+            usecols=columns, parse_dates=parse_date_columns('ticket', columns))
+        return transform.narrow_integers(df, dtype, 'ticket')
 
 
 class DonorImportStrategy:
     '''Strategy for importing donor data'''
-    def get_data(self, fys, path=None, dtype=None, qtr=None):
+    default_path = '../../data/donor/'
+
+    def get_data(self, fys, path=None, dtype=None, qtr=None, columns=None,
+                 select_fys=None, store=None, **kwargs):
         '''Gets donor data
         args:
             fys -> singular fiscal year for base of file ex. '08' or 13
+            columns -> ColumnSelector of the columns to parse, None for all
+            select_fys -> only read these fiscal years (parsed from campaign)
+                          from the fy partitions of the extract, see partition.
+                          None reads the full extract
+            store -> ColumnStore holding the partitions, defaults to
+                     etl.store.column_store
         '''
-        fp = path or '../../data/donor/'
-        file = f"donors_fy{fys}-present.csv"
-        data = pd.read_csv(fp + file, encoding='ISO-8859-1', dtype=dtype,
-            parse_dates=date_columns.get('donor'), date_parser=transform.date_convert)
+        file = self.source_files(fys=fys, path=path)[0]
 
-        return data
+        if select_fys is not None:
+            return self.read_partitions(fys, select_fys, path=path, dtype=dtype,
+                columns=columns, store=store)
+
+        return self.read_extract(file, dtype=dtype, columns=columns)
+
+    def source_files(self, fys, path=None, qtr=None):
+        fp = path or self.default_path
+        return [fp + f"donors_fy{fys}-present.csv"]
+
+    @staticmethod
+    def read_extract(file, dtype=None, columns=None):
+        date_parser = partial(transform.parse_dates, format=donor_date_format)
+        data = read_file('donor', file, encoding='ISO-8859-1',
+            dtype=transform.read_dtype(dtype), usecols=columns,
+            parse_dates=parse_date_columns('donor', columns), date_parser=date_parser)
+        return transform.narrow_integers(data, dtype, 'donor')
+
+    def partition(self, fys, path=None, store=None):
+        '''Splits the extract into one column store partition per fiscal year
+
+        Done once per version of the extract file (and of the fy parsing),
+        later calls return the stored fys. The extract is read with
+        donor_dtype, read_partitions converts to the dtype requested. Rows
+        without a fiscal year in campaign, or an empty extract, are kept in
+        the None partition
+
+        returns the partitioned fiscal years
+        '''
+        store = store or column_store
+        file = self.source_files(fys=fys, path=path)[0]
+        key = WorkingCache.build_key(type='donor', full=False,
+            version=PrepDonorData.version, files=[file], dtype=repr(donor_dtype),
+            compact_dtype=repr(compact_donor_dtype),
+            fy_patterns=repr(PrepDonorData.fy_patterns))
+
+        stored = store.partitions(self.store_type(fys), key=key)
+        if stored is not None:
+            return stored
+
+        data = self.read_extract(file, dtype=donor_dtype)
+        data_fys = transform.extract_fys(data['campaign'], PrepDonorData.fy_patterns)
+
+        partitions = {int(fy): data.take(rows).reset_index(drop=True)
+            for fy, rows in sorted(data_fys.groupby(data_fys).indices.items())}
+        if data_fys.isnull().any() or not partitions:
+            partitions[None] = data.loc[data_fys.isnull()].reset_index(drop=True)
+
+        print(f'donor: partitioned {file} into {len(partitions)} fiscal years')
+        store.write_partitions(self.store_type(fys), partitions, key=key)
+        return list(partitions)
+
+    def read_partitions(self, fys, select_fys, path=None, dtype=None, columns=None,
+                        store=None):
+        '''Reads the select_fys partitions of the extract, see partition
+
+        Rows are ordered by fiscal year, then as in the extract
+        '''
+        store = store or column_store
+        stored = self.partition(fys, path=path, store=store)
+        select_fys = select_fys if isinstance(select_fys, list) else [select_fys]
+        selected = [fy for fy in select_fys if fy in stored]
+        names = None if columns is None else list(columns.columns)
+
+        if selected:
+            data = store.read(self.store_type(fys), selected, columns=names)
+        elif not stored:
+            file = self.source_files(fys=fys, path=path)[0]
+            raise Exception(f'no donor partitions stored for {file} in {store.directory}')
+        else:
+            data = store.read(self.store_type(fys), stored[0], columns=names).iloc[:0]
+
+        # strings are stored dictionary encoded, restore the dtypes of the csv read
+        restore = {}
+        dates = parse_date_columns('donor', columns) or []
+        for col in data.columns:
+            kind = None if col in dates else (dtype or {}).get(col)
+            if data[col].dtype.name == 'category' and kind != 'category':
+                restore[col] = object
+            elif kind is not None and data[col].dtype != kind and \
+                    not transform.is_narrow_integer(kind):
+                restore[col] = kind
+
+        return transform.narrow_integers(data.astype(restore), dtype, 'donor')
+
+    @staticmethod
+    def store_type(fys):
+        return f'donor_fy{fys}'
 
 
 class SubscriberImportStrategy:
     '''Strategy for import subscriber data'''
+    default_path = '../../data/sub/'
+
     @check_fys_is_int
-    def get_data(self, fys, path=None, dtype=None, qtr=None):
-        fp = path or '../../data/sub/'
-        data_gen = (self.import_file(fy=fy, path=fp) for fy in fys)
+    def get_data(self, fys, path=None, dtype=None, qtr=None, workers=None,
+                 executor='thread', columns=None):
+        fp = path or self.default_path
+        import_fy = partial(self.import_file, path=fp, columns=columns)
+        data_gen = parallel_map(import_fy, fys, workers=workers, executor=executor)
         data = pd.concat(data_gen, ignore_index=True)
         return data
 
-    def import_file(self, fy, path):
-        data = pd.read_csv(path + f'fy{fy}.csv', encoding='ISO-8859-1',
-            parse_dates=date_columns.get('subscriber'))
+    @check_fys_is_int
+    def source_files(self, fys, path=None, qtr=None):
+        fp = path or self.default_path
+        return [self.source_file(fy=fy, path=fp) for fy in fys]
+
+    @staticmethod
+    def source_file(fy, path):
+        return path + f'fy{fy}.csv'
+
+    def import_file(self, fy, path, columns=None):
+        data = read_file('subscriber', self.source_file(fy=fy, path=path), encoding='ISO-8859-1',
+            usecols=columns, parse_dates=parse_date_columns('subscriber', columns))
         return data
 
 
 class ModeOfSaleImportStrategy:
     '''Strategy for importing mode of sale data'''
-    def get_data(self, fys, qtr, path=None, dtype=None):
-        fp = path or '../../data/mode_of_sale/'
-        data = pd.read_csv(f'{fp}q{qtr}_{fys}.csv')
+    default_path = '../../data/mode_of_sale/'
+
+    def get_data(self, fys, qtr=None, path=None, dtype=None, workers=None,
+                 executor='thread', columns=None, **kwargs):
+        '''Imports the quarter files of every (fy, qtr) period into one frame,
+        with fy and qtr columns
+
+        args:
+            fys -> fiscal year or list of them, or a list of (fy, qtr) periods
+            qtr -> quarter (1-4) or list of quarters of every fy. None for
+                   every quarter file found, raises FileNotFoundError if
+                   there are none
+            workers -> if > 1, files are parsed concurrently in a pool
+        '''
+        fp = path or self.default_path
+        import_period = partial(self.import_file, path=fp, columns=columns)
+        data_gen = parallel_map(import_period, self.periods(fys=fys, path=fp, qtr=qtr),
+            workers=workers, executor=executor)
+        data = pd.concat(data_gen, ignore_index=True)
         return data
 
+    def periods(self, fys, path=None, qtr=None):
+        '''The (fy, qtr) periods requested as ints, see get_data
+
+        ints match the fy and qtr columns of import_file, so '20' and 20
+        are the same period
+        '''
+        fp = path or self.default_path
+
+        if isinstance(fys, list) and all(isinstance(fy, tuple) for fy in fys):
+            return [(int(fy), int(q)) for fy, q in fys]
+
+        fys = [int(fy) for fy in (fys if isinstance(fys, list) else [fys])]
+
+        if qtr is None:
+            periods = [(fy, q) for fy in fys for q in range(1, 5)
+                if os.path.exists(self.source_file(fy=fy, qtr=q, path=fp))]
+
+            if not periods:
+                raise FileNotFoundError(f'no mode of sale quarter files for fys {fys} '
+                    f'in {fp}, expected {self.source_file(fy=fys[0], qtr=1, path=fp)}')
+            return periods
+
+        qtrs = [int(q) for q in (qtr if isinstance(qtr, list) else [qtr])]
+        return [(fy, q) for fy in fys for q in qtrs]
+
+    def source_files(self, fys, path=None, qtr=None):
+        fp = path or self.default_path
+        return [self.source_file(fy=fy, qtr=q, path=fp)
+            for fy, q in self.periods(fys=fys, path=fp, qtr=qtr)]
+
+    @staticmethod
+    def source_file(fy, qtr, path):
+        return f'{path}q{qtr}_{fy}.csv'
+
+    def import_file(self, period, path, columns=None):
+        fy, qtr = period
+        data = read_file('mode_of_sale', self.source_file(fy=fy, qtr=qtr, path=path),
+            usecols=columns)
+        data['fy'] = np.array(fy, dtype=np.int64)
+        data['qtr'] = np.array(qtr, dtype=np.int64)
+        return transform.narrow_integers(data, {'fy': fy_dtype, 'qtr': np.int8},
+            'mode_of_sale')
+
 
 class AttributeImportStrategy:
     '''Strategy for importing attribute data'''
+    default_path = '../../data/attribute/'
+
     def get_data(self, file_name=None, path=None, *args, **kwargs):
-        fp = path or '../../data/attribute/'
-        file = file_name or 'capacity_rating.csv'
-        data = pd.read_csv(fp + file, skiprows=7)[['customer_no', 'key_value']]
+        file = self.source_files(file_name=file_name, path=path)[0]
+        columns = ['customer_no', 'key_value']
+        data = read_file('attribute', file, skiprows=7, usecols=columns)[columns]
 
         return data
+
+    def source_files(self, file_name=None, path=None, *args, **kwargs):
+        fp = path or self.default_path
+        return [fp + (file_name or 'capacity_rating.csv')]
@@ -1,6 +1,8 @@
+import re
+
 import pandas as pd
 from . import transform, filter
-from .helpers import internal_ids
+from .helpers import internal_ids, fy_dtype
 from .decorators import cache_working_data, check_working_cache, timer
 
 
@@ -18,11 +20,36 @@ class PrepDataFactory:
         return self.mapper.get(type)
 
 
+def assign_fy(data, fys, type, source):
+    '''Adds fys as the compact integer fy column
+
+    Rows without a fiscal year are dropped and reported
+
+    args:
+        fys -> float series aligned with data, NaN where unparsed
+        source -> column fys was derived from, used in the report
+    '''
+    unparsed = fys.isnull()
+
+    if unparsed.any():
+        examples = list(data.loc[unparsed, source].drop_duplicates()[:5])
+        print(f'{type}: dropped {unparsed.sum()} rows without a fiscal year in '
+              f'{source}, ex. {examples}')
+        data = data.loc[~unparsed].reset_index(drop=True)
+        fys = fys.loc[~unparsed]
+
+    data['fy'] = fys.values.astype('int64')
+    return transform.narrow_integers(data, {'fy': fy_dtype}, type)
+
+
 class PrepTicketData:
+    version = 2
+    required_columns = ['perf_dt', 'season_desc', 'zone_desc', 'summary_cust_id']
+
     @timer
     @check_working_cache
     @cache_working_data
-    def prepare_data(self, dataframe, full, type):
+    def prepare_data(self, dataframe, full, type, cache_key=None):
         '''Prepares the ticketing data for analysis
 
         args:
@@ -30,11 +57,17 @@ class PrepTicketData:
             full -> Boolean. Removes internal ids and unsold
         '''
         data = dataframe.copy()
+        return self.prepare_chunk(data, full)
 
+    def prepare_chunk(self, data, full):
+        '''Prepares a chunk of ticketing data in place, without the defensive copy
+
+        Used when streaming, where each chunk is owned by the pipeline
+        '''
         data['dow'] = transform.add_dow(data['perf_dt'])
-        data['series'] = self.add_series_name(data['season_desc'])
-        data['fy'] = data['perf_dt'].map(transform.convert_to_fy)
-        data['price_zone'] = data['zone_desc'].map(self.zone_mapper)
+        data['series'] = transform.transforms.apply('series_name', data['season_desc'])
+        data = assign_fy(data, transform.convert_to_fys(data['perf_dt']), 'ticket', 'perf_dt')
+        data['price_zone'] = transform.transforms.apply('price_zone', data['zone_desc'])
 
         if full:
             data = data[pd.notnull(data['summary_cust_id'])]\
@@ -55,72 +88,81 @@ class PrepTicketData:
         else:
             return zone
 
+    @staticmethod
+    def series_name(season):
+        return season.split(" ")[-1]
+
     @staticmethod
     def add_series_name(pd_series):
-        return pd_series.transform(lambda x: x.split(" ")[-1])
+        return transform.transforms.apply('series_name', pd_series)
+
 
+transform.transforms.register('price_zone', PrepTicketData.zone_mapper)
+transform.transforms.register('series_name', PrepTicketData.series_name)
 
 
 class PrepDonorData:
+    version = 2
+    required_columns = ['campaign']
+    # ex. 'PS 18-19 Individual' -> 19
+    fy_patterns = [(r'^.{6}(\d{2})', 0)]
+
     @timer
     @check_working_cache
     @cache_working_data
-    def prepare_data(self, dataframe, full, type):
+    def prepare_data(self, dataframe, full, type, cache_key=None):
         data = dataframe.copy()
+        return self.prepare_chunk(data, full)
 
+    def prepare_chunk(self, data, full):
+        '''Prepares a chunk of donor data in place, without the defensive copy'''
         if full:
-            data['fy'] = data['campaign'].str[6:8]
-            fy_mapper = self.fy_mapper_builder(data)
-            data = self.parse_campaign_fy(data, fy_mapper)
+            fys = transform.extract_fys(data['campaign'], self.fy_patterns)
+            data = assign_fy(data, fys, 'donor', 'campaign')
 
         return data
 
 
-    @staticmethod
-    def parse_campaign_fy(data, fy_mapper):
-        '''parses the campaign year into a new column called "fy"'''
-        mask = data['fy'].map(fy_mapper) # map the fys
-        data = data.loc[mask].reset_index(drop=True)
-        data = data.astype({'fy': 'int64'}) # convert to int
-        return data
-
-
-    @staticmethod
-    def fy_mapper_builder(data):
-        fy_mapper = {fy: False for fy in data['fy'].drop_duplicates()}
-        for fy in fy_mapper.keys():
-            try:
-                int(fy[0])
-                fy_mapper[fy] = True
-            except:
-                continue
-        return fy_mapper
-
-
 class PrepSubscriberData:
+    version = 2
+    required_columns = ['season_desc', 'tot_due_amt']
+    # ex. 'PS 2018 Summer' -> 19 and 'PS 18-19 Classics' -> 19
+    fy_patterns = [(r'^(?=.*Summer)\S* \d{2}(\d{2})\b', 1),
+                   (r'^(?!.*Summer)[^-]*-(\d{2})', 0)]
+
     @timer
-    def prepare_data(self, dataframe, full, type):
+    def prepare_data(self, dataframe, full, type, cache_key=None):
         data = dataframe.copy()
-        data['fy'] = data['season_desc'].map(self.parse_fy)
+        fys = transform.extract_fys(data['season_desc'], self.fy_patterns)
+        data = assign_fy(data, fys, 'subscriber', 'season_desc')
         data = filter.filter_paid_only(data, 'tot_due_amt')
         return data
 
-    @staticmethod
-    def parse_fy(description):
-        if 'Summer' in description:
-            fy = int(description.split(' ')[1][2:]) + 1
-        else:
-            fy = int(description.split('-')[1][:2])
-        return fy
-
 
 class PrepModeOfSaleData:
+    version = 2
+    required_columns = ['season', 'ps_num_ord', 'cs_num_ord', 'ps_tot_paid_amt',
+                        'cs_tot_paid_amt', 'mos_desc']
+    mos_desc_mapper = {
+        'OC Box Office': 'OC Box Office',
+        'OC Donor Relations': 'OC Box Office',
+        'OC House': 'OC Box Office',
+        'OC Mobile': 'OC Box Office'
+    }
+
     @timer
     @check_working_cache
     @cache_working_data
-    def prepare_data(self, dataframe, full, type):
+    def prepare_data(self, dataframe, full, type, cache_key=None):
         data = dataframe.copy()
-        data['season'] = [season.split(' ')[2] for season in data['season']]
+        return self.prepare_chunk(data, full)
+
+    def prepare_chunk(self, data, full):
+        '''Prepares mode of sale data in place, without the defensive copy
+
+        Used by PSData.prep_partitions to prepare several quarters at once
+        '''
+        data['season'] = transform.transforms.apply('season_name', data['season'])
         data['ordered'] = data['ps_num_ord'] + data['cs_num_ord']
         data['paid'] = data['ps_tot_paid_amt'] + data['cs_tot_paid_amt']
 
@@ -130,22 +172,30 @@ class PrepModeOfSaleData:
         return data
 
     @staticmethod
-    def fix_mos_desc(data):
-        mapper = {
-            'OC Box Office': 'OC Box Office',
-            'OC Donor Relations': 'OC Box Office',
-            'OC House': 'OC Box Office',
-            'OC Mobile': 'OC Box Office'
-        }
+    def season_name(season):
+        return season.split(' ')[2]
+
+    @classmethod
+    def mos_desc(cls, desc):
+        return re.sub('OC', 'SCFTA', cls.mos_desc_mapper.get(desc, desc))
 
-        data['mos_desc'] = data['mos_desc'].replace(mapper)
-        data['mos_desc'] = data['mos_desc'].replace({'OC': 'SCFTA'}, regex=True)
+    @staticmethod
+    def fix_mos_desc(data):
+        data['mos_desc'] = transform.transforms.apply('mos_desc', data['mos_desc'])
         return data
 
+
+transform.transforms.register('season_name', PrepModeOfSaleData.season_name)
+transform.transforms.register('mos_desc', PrepModeOfSaleData.mos_desc)
+
+
 class PrepAttributeData:
+    version = 1
+    required_columns = ['customer_no', 'key_value']
+
     @timer
     @check_working_cache
     @cache_working_data
-    def prepare_data(self, dataframe, full, type):
+    def prepare_data(self, dataframe, full, type, cache_key=None):
         data = dataframe.copy()
         return data
@@ -1,9 +1,18 @@
+import os
+
+import pandas as pd
+
 from .exception import UnexpectedDataType
 from .data_import import ImportData
 from .data_prep import PrepDataFactory
 from .analysis import TierAnalysis, PreConcertSegmentation, DonorWeekly
 from .plot import PlotFactory
-from . import filter, transform
+from .cache import working_cache
+from .store import column_store
+from .incremental import IncrementalIngest
+from .index import index_data
+from .summary import customer_summary
+from . import filter, transform, aggregator
 
 class DataFactory:
     '''Factory used to create the data type necessary for analysis'''
@@ -30,39 +39,363 @@ class PSData:
     def __init__(self, object):
         self.type = object()
         self.raw = None
-        self.working = None
-        self.raw_prior = None
-        self.working_prior = None
+        self._loaders = {}
+        self._loaded = {}
         self.preparer = self.prep_factory.get_preparer(self.type._type)()
+        self.ingest = IncrementalIngest()
+
+    # working, raw_prior and working_prior are computed on first access by
+    # the loaders get_data registers, then memoized until new data is loaded
+    @property
+    def working(self):
+        return self.load('working')
+
+    @working.setter
+    def working(self, data):
+        self.assign('working', data)
+
+    @property
+    def raw_prior(self):
+        return self.load('raw_prior')
+
+    @raw_prior.setter
+    def raw_prior(self, data):
+        self.assign('raw_prior', data)
+
+    @property
+    def working_prior(self):
+        return self.load('working_prior')
+
+    @working_prior.setter
+    def working_prior(self, data):
+        self.assign('working_prior', data)
+
+    def load(self, name):
+        if name not in self._loaded:
+            loader = self._loaders.get(name)
+            # the loader is kept until it succeeds so a failure repeats
+            self._loaded[name] = loader() if loader else None
+            self._loaders.pop(name, None)
+        return self._loaded[name]
+
+    def assign(self, name, data):
+        self._loaders.pop(name, None)
+        self._loaded[name] = data
+
+    def is_loaded(self, name):
+        '''True once a lazy attribute has been computed (or assigned)'''
+        return name in self._loaded
+
+    def reset(self):
+        '''Drops the data (and pending loaders) of the last load'''
+        self.raw = None
+        self._loaders = {}
+        self._loaded = {}
 
+    def get_data(self, fys, path=None, qtr=None, workers=None, executor='thread',
+                 compact=False, columns=None, incremental=False, release_raw=False,
+                 index=False, select_fys=None):
+        '''Imports raw, working is prepared from it on first access
 
-    def get_data(self, fys, path=None, qtr=None):
-        '''qtr is only used for ModeOfSale (1, 2, 3, or 4)'''
-        importer = ImportData()
+        For subscribers and an int fy the prior year is imported into
+        raw_prior/working_prior, also on first access
 
-        if self.type._type == 'mode_of_sale' and qtr is None:
-            raise Exception('qtr arg must contain an integer of 1, 2, 3, or 4.')
+        ModeOfSale imports every (fy, qtr) period into one frame with fy and
+        qtr columns, and caches the prepared data per period (prep_partitions)
 
-        self.raw = importer.send_data(type=self.type._type, fys=fys,
-            path=path, qtr=qtr)
+        args:
+            workers -> import a list of fys concurrently with a pool this size
+            executor -> 'thread' or 'process' pool used when workers > 1
+            compact -> Boolean. Import ticket/donor data with the compact
+                       schema (categoricals, downcast integers, nullable ids)
+            columns -> only parse these columns (plus the ones the preparer
+                       needs), ex. PreConcertSegmentation.ticket_columns.
+                       None reads every column
+            incremental -> Boolean. Ticket/donor only. Reuse the prepared data
+                           of the last run and prepare only the new or changed
+                           days, working is then ordered by order_dt/trn_dt
+                           day, see IncrementalIngest (stats in self.ingest)
+            qtr -> ModeOfSale only. Quarter (1-4) or list of quarters of
+                   each fy, None for every quarter file found. fys can also
+                   be a list of (fy, qtr) periods
+            release_raw -> Boolean. Drop raw (raw_prior) once working
+                           (working_prior) has been prepared from it
+            index -> Boolean. Index working (working_prior) once prepared,
+                     see build_index
+            select_fys -> Donor only. Read only these fiscal years from the
+                          fy partitions of the extract (split once, see
+                          DonorImportStrategy.partition), ex.
+                          TierAnalysis.donor_fys(20)
+        '''
+        importer = ImportData()
+        columns = self.project_columns(columns)
 
-        self.working = self.prep_data(self.raw)
+        self.reset()
+        self.raw = importer.send_data(type=self.type._type, fys=fys,
+            path=path, qtr=qtr, workers=workers, executor=executor, compact=compact,
+            columns=columns, select_fys=select_fys)
+
+        source = importer.describe_source(type=self.type._type, fys=fys,
+            path=path, qtr=qtr, compact=compact, columns=columns, select_fys=select_fys)
+
+        def load_working():
+            if incremental:
+                working = self.ingest_data(self.raw, source=source)
+            elif self.type._type == 'mode_of_sale':
+                sources = importer.describe_partitions(type=self.type._type, fys=fys,
+                    path=path, qtr=qtr, compact=compact, columns=columns)
+                working = self.prep_partitions(self.raw, sources, by=['fy', 'qtr'])
+            else:
+                working = self.prep_data(self.raw, source=source)
+
+            if release_raw:
+                self.raw = None
+            if index:
+                index_data(working)
+            return working
+
+        self._loaders['working'] = load_working
 
         if self.type._type == 'subscriber' and isinstance(fys, int):
-            self.raw_prior = importer.send_data(type=self.type._type,
-                fys=fys-1, path=path, qtr=qtr)
+            source_prior = importer.describe_source(type=self.type._type,
+                fys=fys-1, path=path, qtr=qtr, compact=compact, columns=columns)
+
+            def load_raw_prior():
+                return importer.send_data(type=self.type._type, fys=fys-1,
+                    path=path, qtr=qtr, compact=compact, columns=columns)
+
+            def load_working_prior():
+                working_prior = self.prep_data(self.raw_prior, source=source_prior)
+
+                if release_raw:
+                    self.raw_prior = None
+                if index:
+                    index_data(working_prior)
+                return working_prior
+
+            self._loaders['raw_prior'] = load_raw_prior
+            self._loaders['working_prior'] = load_working_prior
+
+        return
+
+    def open_data(self, fys, path=None, full=True, columns=None, store=None,
+                  index=False):
+        '''Opens the prepared data from the column store, memory mapped
+
+        Each fiscal year is imported, prepared and written to the store once
+        (again only when its source file changes), later calls only map the
+        column files. raw is not kept. Ticket, subscriber and donor only
+        (donor fys is the fy of the extract, ex. 13 for donors_fy13-present.csv)
+
+        working differs from get_data in two ways:
+            String columns are opened as categoricals, so assigning a value
+            outside the categories raises (astype(object) first)
+            Columns are mapped copy on write, in place edits work and stay
+            in this process, the store is left untouched
+
+        args:
+            full -> Boolean. Use True for full prep
+            columns -> only open these columns, None for all
+            store -> ColumnStore, defaults to etl.store.column_store
+            index -> Boolean. Index working, see build_index
+        '''
+        store = store or column_store
+        importer = ImportData()
+        type = self.type._type
+
+        if type not in ('ticket', 'subscriber', 'donor'):
+            raise Exception(f'{type} data can not be opened from the store')
+
+        partitions = fys if isinstance(fys, list) else [fys]
 
-            self.working_prior = self.prep_data(self.raw_prior)
+        for fy in partitions:
+            source = importer.describe_source(type=type, fys=fy, path=path)
+            key = working_cache.build_key(type=type, full=full,
+                version=self.preparer.version, **source)
 
+            if not store.has(type, fy, key):
+                raw = importer.send_data(type=type, fys=fy, path=path)
+                store.write(type, fy, self.prep_data(raw, full=full, source=source),
+                    key=key)
+
+        self.reset()
+        self.working = store.read(type, partitions, columns=columns)
+
+        if index:
+            self.build_index()
         return
 
-    def prep_data(self, data, full=True):
+    def build_index(self, data='working', **columns):
+        '''Indexes the prepared data: fy partitions, perf_dt sorted offsets and
+        a summary_cust_id hash index (see etl.index.DataIndex)
+
+        The filters (fys, customers, before_date, ...) and PreConcertSegmentation
+        use the indexes automatically, as long as the frame is not replaced
+
+        args:
+            data -> 'working' or 'working_prior'
+            columns -> partitions, sorted and hashed column lists
+        '''
+        return index_data(getattr(self, data), **columns)
+
+    def customer_summary(self, data='working'):
+        '''Per customer, per fy summary of the ticket data, see CustomerSummary
+
+        Built once per frame. filter_new_to_file, filter_by_minimum_transactions
+        and PreConcertSegmentation answer from it while the frame is kept
+
+        args:
+            data -> 'working' or 'working_prior'
+        '''
+        return customer_summary(getattr(self, data))
+
+    def latest_values(self, columns, order_by, key='summary_cust_id', data='working'):
+        '''Most recent value of columns per key, ex. the solicitor, creditee or
+        channel of each donor's latest gift (order_by='trn_dt')
+
+        Cached per frame, see aggregator.latest_aggregator
+
+        args:
+            data -> 'raw', 'working' or 'working_prior'
+        '''
+        return aggregator.latest_aggregator(getattr(self, data), key, columns, order_by)
+
+    def stream_data(self, fys, path=None, chunksize=100000, full=True, compact=False,
+                    columns=None):
+        '''Yields prepared chunks of at most chunksize rows
+
+        Neither raw nor working are kept, so memory stays bounded by the
+        chunk size. Only ticket data can be streamed. Consume the chunks with
+        filter.filter_chunks and aggregator.chunked_aggregator
+        '''
+        importer = ImportData()
+        chunks = importer.stream_data(type=self.type._type, fys=fys, path=path,
+            chunksize=chunksize, compact=compact, columns=self.project_columns(columns))
+
+        for chunk in chunks:
+            yield self.preparer.prepare_chunk(chunk, full)
+
+    def ingest_data(self, data, source, full=True):
+        '''prepares data incrementally against the prepared data of the last
+        run of the same source (same files, fys and options)
+        '''
+        paths = [os.path.abspath(file) for file in source['files']]
+        name = working_cache.build_key(type=self.type._type, full=full,
+            version=self.preparer.version, **dict(source, files=(), paths=paths))
+
+        return self.ingest.refresh(data, self.preparer, type=self.type._type,
+            full=full, name=name)
+
+    def project_columns(self, columns):
+        '''Adds the columns the preparer derives others from to a projection'''
+        if columns is None:
+            return None
+        return sorted(set(columns) | set(self.preparer.required_columns))
+
+    def prep_data(self, data, full=True, source=None):
         '''prepares data for analysis
 
         args:
             full -> Boolean. Use True for full prep
+            source -> files/fys/qtr the data was imported from, used to key
+                      the working cache. The data is hashed instead if None
+        '''
+        cache_key = None
+        if source is not None:
+            cache_key = working_cache.build_key(type=self.type._type, full=full,
+                version=self.preparer.version, **source)
+
+        return self.preparer.prepare_data(data, full, type=self.type._type,
+            cache_key=cache_key)
+
+    def prep_partitions(self, data, sources, by, full=True):
+        '''prepares data with a working cache entry per partition
+
+        Cached partitions are read back, the missing ones are prepared together
+        in one vectorized pass (preparer.prepare_chunk) and cached one by one,
+        so adding a quarter only prepares that quarter
+
+        args:
+            sources -> {partition: source} in output order, a partition is
+                       the tuple of its by values, source as in prep_data
+            by -> columns identifying the partition of a row, ex. ['fy', 'qtr']
+        '''
+        type = self.type._type
+
+        if not sources:
+            raise Exception(f'{type}: no partitions to prepare')
+
+        keys = {partition: working_cache.build_key(type=type, full=full,
+                    version=self.preparer.version, **source)
+                for partition, source in sources.items()}
+        parts = {partition: working_cache.read(type, key) for partition, key in keys.items()}
+        missing = [partition for partition, part in parts.items() if part is None]
+
+        if missing:
+            print(f'{type}: preparing {len(missing)} of {len(parts)} partitions')
+            partitions = pd.MultiIndex.from_arrays([data[col] for col in by])
+
+            # rows outside every partition would leave a partition empty in the cache
+            unmatched = ~partitions.isin(list(sources))
+            if unmatched.any():
+                examples = list(partitions[unmatched].unique()[:5])
+                raise Exception(f'{type}: {unmatched.sum()} rows match none of the '
+                                f'partitions {list(sources)}, ex. {examples}')
+
+            rows = partitions.isin(missing)
+            prepared = self.preparer.prepare_chunk(data.loc[rows].reset_index(drop=True), full)
+            groups = dict(list(prepared.groupby(by, sort=False)))
+
+            for partition in missing:
+                part = groups.get(partition, prepared.iloc[:0]).reset_index(drop=True)
+                working_cache.write(type, keys[partition], part)
+                parts[partition] = part
+
+        return pd.concat([parts[partition] for partition in sources], ignore_index=True)
+
+    def apply_filters(self, filters, data='working', columns=None):
+        '''Applies an ordered list of named filters with one fused mask
+
+        The rows are materialized once, see filter.pipeline_mask
+
+        args:
+            filters -> list of names from self.type.filters, or of
+                       (name, kwargs) for filters with arguments, ex.
+                       [('series', {'series': ['Classics', 'Pops']}), 'non_subs',
+                        ('paid', {'column': 'paid_amt'})]
+            data -> 'raw', 'working', 'raw_prior' or 'working_prior'
+            columns -> only materialize these columns, None for all
+        '''
+        registry = getattr(self.type, 'filters', {})
+        steps = []
+
+        for step in filters:
+            name, kwargs = (step, {}) if isinstance(step, str) else step
+
+            if name not in registry:
+                raise Exception(f'{name} must match one of: {list(registry.keys())}')
+
+            steps.append((registry[name], kwargs))
+
+        frame = getattr(self, data)
+        return filter.select(frame, filter.pipeline_mask(frame, steps), columns=columns)
+
+    def memory_report(self, data='working'):
+        '''Per column memory usage of the raw or working data, largest first
+
+        args:
+            data -> 'raw', 'working', 'raw_prior' or 'working_prior'
         '''
-        return self.preparer.prepare_data(data, full, type=self.type._type)
+        frame = getattr(self, data)
+        usage = frame.memory_usage(index=False, deep=True)
+
+        report = pd.DataFrame({
+            'column': usage.index,
+            'dtype': [str(frame[col].dtype) for col in usage.index],
+            'bytes': usage.values
+        })
+
+        return report.sort_values('bytes', ascending=False).reset_index(drop=True)
 
 
 
@@ -79,7 +412,8 @@ class Ticket:
             'single_sales': filter.filter_single_sales_only,
             'before_date': filter.filter_before_date,
             'ntf': filter.filter_new_to_file,
-            'min_transactions': filter.filter_by_minimum_transactions
+            'min_transactions': filter.filter_by_minimum_transactions,
+            'customers': filter.filter_customers
         }
         self.transform = {
             'price_type_group': transform.transform_price_type_group
@@ -92,7 +426,8 @@ class Donor:
         self.tier_analysis = TierAnalysis()
         self.donor_weekly = DonorWeekly()
         self.filters = {
-            'fys': filter.filter_fys
+            'fys': filter.filter_fys,
+            'customers': filter.filter_customers
         }
 
     @staticmethod
@@ -1,10 +1,8 @@
-import os
 from functools import wraps
+import inspect
 import time
 
-import pandas as pd
-
-from .helpers import cached_dtypes, date_columns
+from .cache import working_cache, dataset_memo
 
 
 def timer(func):
@@ -64,11 +62,9 @@ def cache_working_data(func):
     def wrapper(*args, **kwargs):
         value = func(*args, **kwargs)
         type = kwargs.get('type')
+        cache_key = kwargs.get('cache_key') or working_data_key(func, args, kwargs)
 
-        if not os.path.exists('cache'):
-            os.mkdir('cache')
-
-        value.to_csv(f'cache/{type}_working.csv', index=False)
+        working_cache.write(type, cache_key, value)
         print('saved working to cache')
 
         return value
@@ -80,12 +76,44 @@ def check_working_cache(func):
     def wrapper(*args, **kwargs):
         type = kwargs.get('type')
 
-        if os.path.exists(f'cache/{type}_working.csv'):
+        if kwargs.get('cache_key') is None:
+            kwargs['cache_key'] = working_data_key(func, args, kwargs)
+
+        data = working_cache.read(type, kwargs['cache_key'])
+
+        if data is not None:
             print('reading from cache')
-            data = pd.read_csv(f'cache/{type}_working.csv',
-                dtype=cached_dtypes.get(type), parse_dates=date_columns.get(type))
             return data
 
         print('not found in cache')
         return func(*args, **kwargs)
     return wrapper
+
+
+def memoize_import(func):
+    '''Memoizes reads of a source file in the process wide dataset_memo
+
+    The wrapped function must take (type, file, **read_args)
+    '''
+    @wraps(func)
+    def wrapper(type, file, **kwargs):
+        key = dataset_memo.build_key(type, file, **kwargs)
+        data = dataset_memo.get(key)
+
+        if data is None:
+            data = func(type, file, **kwargs)
+            if dataset_memo.put(key, data):
+                data = data.copy()
+
+        return data
+    return wrapper
+
+
+def working_data_key(func, args, kwargs):
+    '''Cache key for a prepare_data call made without a known source
+
+    The raw dataframe is hashed so identical input maps to the same entry
+    '''
+    bound = inspect.signature(func).bind(*args, **kwargs).arguments
+    return working_cache.build_key(type=bound.get('type'), full=bound.get('full'),
+        version=bound['self'].version, data=bound.get('dataframe'))
@@ -1,3 +1,8 @@
 class UnexpectedDataType(Exception):
     '''Error attempting to build data type from factory'''
     pass
+
+
+class UnexpectedCacheFormat(Exception):
+    '''Error attempting to select an unknown working cache format'''
+    pass
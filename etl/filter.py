@@ -1,10 +1,209 @@
+import numpy as np
+import pandas as pd
 
-def filter_individual_giving(data):
-    data = data.copy()
-    mask = data.campaign.str.contains('Government|Foundation|Corporate', regex=True)
-    data = data.loc[~mask].reset_index(drop=True)
+from .index import get_index, HashIndex, SortedIndex, positions_mask
+from .summary import get_summary
+
+
+# Filters come in two forms. filter_* functions return a new frame with the
+# kept rows (the input is never modified). *_mask functions return a boolean
+# array instead, so chained filters can be combined and materialized once
+# with select, ex.
+#   in_series = series_mask(data, ['Classics'])
+#   data = select(data, in_series, non_subs_mask(data, within=in_series),
+#                 paid_mask(data, 'paid_amt'))
+# pipeline_mask (PSData.apply_filters) does the same from filter functions.
+# *_rows functions look rows up in the indexes of the data (PSData.build_index)
+# and return sorted row positions, or a boolean mask when it is not indexed
+
+def select(data, *masks, columns=None):
+    '''Materializes the rows of data kept by every mask as a single new frame
+
+    Args:
+    masks -- boolean arrays aligned with data or arrays of row positions.
+             Rows keep the order of data with a new range index
+    columns -- only materialize these columns, default: all
+    '''
+    if len(masks) == 1 and np.asarray(masks[0]).dtype != bool:
+        rows = np.asarray(masks[0])
+    else:
+        rows = np.flatnonzero(combine_masks(len(data), *masks))
+
+    if columns is not None:
+        # column by column, so only the selected columns are gathered
+        return pd.DataFrame({col: data[col].take(rows).values for col in columns},
+            columns=columns)
+
+    result = data.iloc[rows]
+    result.reset_index(drop=True, inplace=True)
+    return result
+
+
+def combine_masks(length, *masks):
+    '''ANDs boolean masks and row positions into one boolean array'''
+    keep = np.ones(length, dtype=bool)
+
+    for mask in masks:
+        mask = np.asarray(mask)
+        if mask.dtype != bool:
+            positions, mask = mask, np.zeros(length, dtype=bool)
+            mask[positions] = True
+        keep &= mask
+
+    return keep
+
+
+def individual_giving_mask(data):
+    return ~data.campaign.str.contains('Government|Foundation|Corporate',
+        regex=True).values
+
+
+def fys_rows(data, fys):
+    index = get_index(data, 'fy', HashIndex)
+
+    if index is None:
+        return data.fy.isin(fys).values
+
+    return index.positions(fys)
+
+
+def fys_mask(data, fys):
+    return as_mask(len(data), fys_rows(data, fys))
+
+
+def customers_rows(data, ids):
+    index = get_index(data, 'summary_cust_id', HashIndex)
+
+    if index is None:
+        return data['summary_cust_id'].isin(ids).values
+
+    return index.positions(ids)
+
+
+def customers_mask(data, ids):
+    return as_mask(len(data), customers_rows(data, ids))
+
+
+def as_mask(length, rows):
+    rows = np.asarray(rows)
+    return rows if rows.dtype == bool else positions_mask(length, rows)
+
+
+def paid_mask(data, column):
+    return (data[column] > 0).values
+
+
+def list_mask(data, filter_list, column_name, keep_in_list=True):
+    mask = data[column_name].isin(filter_list).values
+
+    if keep_in_list:
+        mask = ~mask
+
+    return mask
+
+
+def series_mask(data, series):
+    return data['series'].isin(series).values
+
+
+def subs_mask(data, within=None):
+    '''Rows of customers with a subscription or flex purchase
+
+    Args:
+    within -- mask of the rows subscribers are looked up in (ex. the rows of
+              previous filters), default: all rows
+    '''
+    is_sub = data['price_type_group'].isin(['Subscription', 'Flex']).values
+
+    if within is not None:
+        is_sub = combine_masks(len(data), is_sub, within)
+
+    current_subs = pd.unique(data['summary_cust_id'].values[is_sub])
+    return customers_mask(data, current_subs)
+
+
+def non_subs_mask(data, within=None):
+    return ~subs_mask(data, within=within)
+
+
+def single_sales_mask(data):
+    return data['price_type_group'].isin(['Single ', 'Single', 'Discount']).values
+
+
+def before_date_rows(data, col, to_date):
+    index = get_index(data, col, SortedIndex)
+
+    if index is None:
+        return (data[col] <= to_date).values
+
+    return index.range(high=to_date)
+
+
+def before_date_mask(data, col, to_date):
+    return as_mask(len(data), before_date_rows(data, col, to_date))
 
-    return data
+
+def date_rows(data, col, date):
+    index = get_index(data, col, SortedIndex)
+
+    if index is None:
+        return (data[col] == date).values
+
+    return index.range(date, date)
+
+
+def date_mask(data, col, date):
+    return as_mask(len(data), date_rows(data, col, date))
+
+
+def day_rows(data, col, day):
+    '''Rows with a col datetime on the calendar day of day, any time of day'''
+    start = pd.Timestamp(day).normalize()
+    end = start + pd.Timedelta(days=1)
+    index = get_index(data, col, SortedIndex)
+
+    if index is None:
+        return ((data[col] >= start) & (data[col] < end)).values
+
+    return index.range(start, end, closed='left')
+
+
+def day_groups(data, col, days):
+    '''Rows of data grouped by the calendar day of col, for each of days
+
+    One pass over col (or one range lookup per day when col is indexed)
+    instead of a scan per day. The rows of a day are order[slices[day]],
+    in row order, so data.take(order) holds every day contiguously
+
+    returns order, slices -> {normalized day: slice of order}
+    '''
+    unique = pd.DatetimeIndex(days).normalize().unique().sort_values()
+    index = get_index(data, col, SortedIndex)
+
+    if len(unique) == 0:
+        return np.array([], dtype=np.intp), {}
+
+    if index is not None:
+        groups = [index.range(day, day + pd.Timedelta(days=1), closed='left')
+            for day in unique]
+        order = np.concatenate(groups)
+        bounds = np.concatenate([[0], np.cumsum([len(group) for group in groups])])
+    else:
+        targets = unique.values.astype('datetime64[D]')
+        values = data[col].values.astype('datetime64[D]')
+        codes = np.minimum(np.searchsorted(targets, values), len(targets) - 1)
+        positions = np.flatnonzero(targets[codes] == values)
+        codes = codes[positions]
+        sort = np.argsort(codes, kind='stable')
+        order = positions[sort]
+        bounds = np.searchsorted(codes[sort], np.arange(len(targets) + 1))
+
+    slices = {day: slice(start, end) for day, start, end in zip(unique, bounds[:-1], bounds[1:])}
+    return order, slices
+
+
+def filter_individual_giving(data):
+    return select(data, individual_giving_mask(data))
 
 
 def filter_fys(data, fys):
@@ -14,21 +213,16 @@ def filter_fys(data, fys):
     fys -- An iterable of fiscal years
            Example: [18, 19]
     '''
-    data = data.copy()
-    mask = data.fy.isin(fys)
-    data = data.loc[mask].reset_index(drop=True)
-
-    return data
+    return select(data, fys_rows(data, fys))
 
 
 def filter_paid_only(data, column):
-    data = data.loc[data[column] > 0].reset_index(drop=True)
-    return data
+    return select(data, paid_mask(data, column))
 
 
 def filter_by_list(data, filter_list, column_name, keep_in_list=True):
     '''filters data by a provided list and column name
-    note: data must have been run through 'parse_campaign_fy' method to add fy column
+    note: data must have been prepared (PrepDonorData) to add the fy column
 
     Args:
     filter_list -- A list of vals to filter on
@@ -37,14 +231,7 @@ def filter_by_list(data, filter_list, column_name, keep_in_list=True):
                     default: True
 
     '''
-    mask = data[column_name].isin(filter_list)
-
-    if keep_in_list:
-        mask = ~mask
-
-    data = data.loc[mask].reset_index(drop=True)
-
-    return data
+    return select(data, list_mask(data, filter_list, column_name, keep_in_list))
 
 
 def filter_by_series(data, series):
@@ -55,66 +242,53 @@ def filter_by_series(data, series):
     series -- Iterable consisting of the names of the series' to include
               Default: ['Classics', 'Pops', 'Summer']
     '''
-    result = data[data['series'].isin(series)].reset_index(drop=True)
-    return result
+    return select(data, series_mask(data, series))
 
 
 def filter_non_subs(data):
-    current_subs = data.loc[
-        (data['price_type_group'] == 'Subscription') |\
-        (data['price_type_group'] == 'Flex')
-    ]
-    current_subs = set(current_subs['summary_cust_id'])
-
-    result = data.loc[~data['summary_cust_id'].isin(current_subs)].reset_index(drop=True)
-    return result
+    return select(data, non_subs_mask(data))
 
 
 def filter_subs(data):
-    current_subs = data.loc[
-        (data['price_type_group'] == 'Subscription') |\
-        (data['price_type_group'] == 'Flex')
-    ]
-    current_subs = set(current_subs['summary_cust_id'])
+    return select(data, subs_mask(data))
 
-    result = data.loc[data['summary_cust_id'].isin(current_subs)].reset_index(drop=True)
-    return result
+
+def filter_customers(data, ids):
+    '''Rows of the customers (summary_cust_id) in ids'''
+    return select(data, customers_rows(data, ids))
 
 def filter_single_sales_only(data):
-    single_sales = data.loc[
-        (data['price_type_group'] == 'Single ') |\
-        (data['price_type_group'] == 'Single') |\
-        (data['price_type_group'] == 'Discount')
-    ]
+    single_sales = data.loc[single_sales_mask(data)]
 
     return single_sales
 
 
 def filter_before_date(data, col, to_date):
-    data = data.copy()
-    result = data.loc[data[col] <= to_date].reset_index(drop=True)
-    return result
+    return select(data, before_date_rows(data, col, to_date))
 
 def filter_by_date(data, col, date):
-    data = data.copy()
-    result = data.loc[data[col] == to_date].reset_index(drop=True)
-    return result
+    return select(data, date_rows(data, col, date))
 
 def filter_new_to_file(data):
-    '''baseline is max year in data provided. All prior years are existing customers'''
-    data = data.copy()
-    baseline = max(data['fy'])
+    '''baseline is max year in data provided. All prior years are existing customers
+
+    Answered from the customer summary of data when one was built
+    (PSData.customer_summary)
+    '''
+    summary = get_summary(data)
+    if summary is not None:
+        return summary.new_to_file()
 
-    current = data.loc[data['fy'] == baseline].reset_index(drop=True)
-    prior = data.loc[data['fy'] != baseline].reset_index(drop=True)
+    baseline = max(data['fy'])
+    is_current = (data['fy'] == baseline).values
 
-    current_customers = set(current.summary_cust_id)
-    existing_customers = set(prior.summary_cust_id)
+    current_customers = set(data['summary_cust_id'].values[is_current])
+    existing_customers = set(data['summary_cust_id'].values[~is_current])
 
     new_to_file = current_customers - existing_customers
 
-    current = current.loc[current.summary_cust_id.isin(new_to_file)]
-    current = current[['summary_cust_id', 'perf_dt']].drop_duplicates()
+    is_new = is_current & data['summary_cust_id'].isin(new_to_file).values
+    current = data.loc[is_new, ['summary_cust_id', 'perf_dt']].drop_duplicates()
     current = current.groupby('summary_cust_id').agg({'perf_dt': 'nunique'}).reset_index()
 
     retained_new = current.loc[current.perf_dt > 1]
@@ -132,9 +306,74 @@ def filter_by_minimum_transactions(data, groupby, transaction_col, min_lim):
     min_lim -- minimum concert purchases to be included
                ex. if min_lim=3, only keep ids with purchases at >=3 concerts
     '''
+    summary = get_summary(data)
+    if summary is not None and groupby == 'summary_cust_id' and transaction_col == 'perf_dt':
+        return summary.minimum_concerts(min_lim)
 
-    data = data.copy()
     data = data.groupby(groupby).agg({transaction_col: 'nunique'}).reset_index()
     data = data.loc[data[transaction_col] >= min_lim].reset_index(drop=True)
 
     return data
+
+
+# mask form of each row filter, used to fuse filters (see pipeline_mask)
+row_masks = {
+    filter_individual_giving: individual_giving_mask,
+    filter_fys: fys_mask,
+    filter_paid_only: paid_mask,
+    filter_by_list: list_mask,
+    filter_by_series: series_mask,
+    filter_non_subs: non_subs_mask,
+    filter_subs: subs_mask,
+    filter_customers: customers_mask,
+    filter_single_sales_only: single_sales_mask,
+    filter_before_date: before_date_mask,
+    filter_by_date: date_mask
+}
+
+# set based masks, their customer set is looked up within the earlier filters
+within_masks = (non_subs_mask, subs_mask)
+
+
+def pipeline_mask(data, steps):
+    '''Fuses an ordered list of filters into one boolean mask
+
+    Each predicate is evaluated once over its column(s) and ANDed, nothing
+    is materialized. Set based filters build their customer set once, from
+    the rows kept by the filters before them, so the result matches
+    chaining the filter functions. Use select to materialize the rows
+
+    Args:
+    steps -- list of (filter function, kwargs), ex.
+             [(filter_by_series, {'series': ['Classics']}),
+              (filter_non_subs, {}), (filter_paid_only, {'column': 'paid_amt'})]
+    '''
+    keep = np.ones(len(data), dtype=bool)
+
+    for filter_func, kwargs in steps:
+        mask_func = row_masks.get(filter_func)
+
+        if mask_func is None:
+            raise Exception(f'{filter_func.__name__} is not a row filter and can not be fused')
+
+        if mask_func in within_masks:
+            keep &= mask_func(data, within=keep, **kwargs)
+        else:
+            keep &= mask_func(data, **kwargs)
+
+    return keep
+
+
+def filter_chunks(chunks, filter_func, **kwargs):
+    '''Applies a filter to each chunk of a stream (see PSData.stream_data)
+
+    Only filters that keep or drop each row on its own (fys, paid, series,
+    before_date, ...) match filtering the full data. Set based filters such
+    as filter_non_subs need the full data.
+
+    example:
+    chunks = ticket.stream_data(fys=[19, 20])
+    paid = filter_chunks(chunks, filter_paid_only, column='paid_amt')
+    '''
+    for chunk in chunks:
+        yield filter_func(data=chunk, **kwargs)
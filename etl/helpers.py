@@ -7,6 +7,9 @@ date_columns = {
     'subscriber': ['order_dt']
 }
 
+# Format of well formed donor dates ex. '4/17/2013 00:00:00'
+donor_date_format = '%m/%d/%Y %H:%M:%S'
+
 ticketing_dtype = {
     'perf_code': object,
     'perf_no': np.int64,
@@ -122,6 +125,97 @@ donor_dtype = {
 }
 
 
+# Compact schemas (PSData.get_data(compact=True)): categoricals for low
+# cardinality strings, downcast integers and nullable integer ids. Integers
+# are read at 64 bits and narrowed when in range, see transform.read_dtype
+compact_ticketing_dtype = {
+    **ticketing_dtype,
+    'perf_code': 'category',
+    'perf_no': np.int32,
+    'zone_no': np.int32,
+    'zone_desc': 'category',
+    'section': 'category',
+    'row': 'category',
+    'seat': np.int16,
+    'seat_status': np.int8,
+    'seat_status_desc': 'category',
+    'customer_no': 'Int32',
+    'order_no': 'Int32',
+    'price_type_group_id': 'Int8',
+    'price_type_group': 'category',
+    'pd_up': 'category',
+    'season': np.int16,
+    'season_desc': 'category',
+    'summary_cust_id': 'Int32',
+    'attended': 'category'
+}
+
+
+compact_donor_dtype = {
+    **donor_dtype,
+    'trn_count': np.dtype('int16'),
+    'batch_no': np.dtype('int32'),
+    'ref_no': np.dtype('int32'),
+    'fund_no': np.dtype('int16'),
+    'fund_desc': 'category',
+    'fyear': 'Int16',
+    'campaign_no': np.dtype('int16'),
+    'campaign': 'category',
+    'cont_designation_id': np.dtype('int16'),
+    'cont_designation': 'category',
+    'channel_id': np.dtype('int16'),
+    'channel_desc': 'category',
+    'pmt_count': np.dtype('int16'),
+    'customer_no': np.dtype('int32'),
+    'creditee_type': 'Int8',
+    'creditee_type_desc': 'category',
+    'creditee_no': 'Int32',
+    'resolved_cust_type': np.dtype('int8'),
+    'resolved_cust_id': np.dtype('int32'),
+    'summary_cust_id': np.dtype('int32'),
+    'cont_fy': np.dtype('int16'),
+    'cont_fy_month': 'category',
+    'cont_cy': np.dtype('int16'),
+    'cont_cy_month': 'category',
+    'trn_fy': np.dtype('int16'),
+    'trn_fy_month': 'category',
+    'trn_cy': np.dtype('int16'),
+    'trn_cy_month': 'category',
+    'post_fy': 'Int16',
+    'post_fy_month': 'category',
+    'post_cy': 'Int16',
+    'post_cy_month': 'category',
+    'ps_sol': 'category',
+    'res_ps_sol': 'category',
+    'sum_ps_sol': 'category',
+    'gl_no': 'category',
+    'gl_natural': np.dtype('int16'),
+    'gl_sub_dept': np.dtype('int16'),
+    'appeal': 'category',
+    'source_id': 'Int32',
+    'fund_super_grp': 'category',
+    'fund_category': 'category',
+    'fund_sub_cate': 'category',
+    'fund_type': 'category',
+    'fund_flag_1': 'category',
+    'fund_flag_2': 'category',
+    'fund_flag_3': 'category',
+    'fund_flag_4': 'category',
+    'fund_flag_5': 'category',
+    'mgmt_this_yr': 'category',
+    'mgmt_last_yr': 'category',
+    'board_flag': np.dtype('int8'),
+    'vol_flag': np.dtype('int8'),
+    'sym100_flag': np.dtype('int8'),
+    'ps_tribute': 'category',
+    'ps_honorarium': 'category'
+}
+
+
+# Derived two digit fiscal year column (ex. 20 for 19-20) of every preparer
+fy_dtype = np.dtype('int16')
+
+
 # Known group sales IDs
 group_sales_ids = [
     44417
@@ -303,8 +397,11 @@ cached_dtypes = {
         'attended':                object,
         'dow':                     object,
         'series':                  object,
-        'fy':                    np.int64,
+        'fy':                    fy_dtype,
         'price_zone':              object,
     },
-    'donor': {}
+    'donor': {
+        **donor_dtype,
+        'fy':                    fy_dtype,
+    }
 }
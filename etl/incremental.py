@@ -0,0 +1,212 @@
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from .data_import import restore_categoricals
+
+
+class IncrementalIngest:
+    '''Keeps prepared data of a growing extract up to date by preparing only
+    the rows of the days that changed since the last run
+
+    Neither extract has a unique order/transaction key (order_no is empty
+    for unsold seats and donor ref_no repeats), so rows are tracked by the
+    day of their order_dt/trn_dt: the row count of every day is kept with
+    the max order_dt/trn_dt as the watermark. On refresh
+        days before the watermark day (less lookback_days) are closed and
+        reused while their row count is unchanged
+        the open days after it and the rows without a date are hashed and
+        reused while their rows are unchanged
+        other days are prepared, days that disappeared are dropped
+    so a refresh only hashes and prepares the open and new days. Edits of
+    closed days that keep their row count are not picked up, clear the
+    state to prepare everything again.
+
+    The prepared data is persisted as one partition per month (the rows
+    without a date in their own), only the months of changed days are
+    rewritten. Strings are stored dictionary encoded to keep reading the
+    unchanged months cheap. The result is ordered by day (rows without a
+    date last), rows of a day in source order.
+
+    args:
+        directory -> folder the partitions and state are persisted to
+        lookback_days -> days before the watermark day still treated as open,
+                         ex. for returns and exchanges of recent orders
+    '''
+    watermark_columns = {
+        'ticket': 'order_dt',
+        'donor': 'trn_dt'
+    }
+
+    def __init__(self, directory=os.path.join('cache', 'incremental'), lookback_days=7):
+        self.directory = directory
+        self.lookback_days = lookback_days
+        self.stats = {}
+
+    @staticmethod
+    def row_days(data, column):
+        '''Day of column as days since epoch, -1 for rows without a date'''
+        if column not in data.columns:
+            return np.full(len(data), -1, dtype=np.int64)
+
+        dates = data[column].values
+        days = dates.astype('datetime64[D]').astype(np.int64)
+        return np.where(np.isnat(dates), -1, days)
+
+    @staticmethod
+    def month_of(day):
+        if day == -1:
+            return 'none'
+        return str(np.datetime64(day, 'D').astype('datetime64[M]'))
+
+    @staticmethod
+    def digest(data):
+        hashes = pd.util.hash_pandas_object(data, index=False).values
+        return zlib.crc32(np.ascontiguousarray(hashes).view(np.uint8))
+
+    def open_from(self, watermark):
+        '''First open day of the refresh after watermark'''
+        if watermark is None:
+            return np.iinfo(np.int64).max
+        return int(np.datetime64(watermark, 'D').astype(np.int64)) - self.lookback_days
+
+    def folder_for(self, type, name):
+        return os.path.join(self.directory, f'{type}_{name[:20]}')
+
+    def load(self, type, name):
+        file = os.path.join(self.folder_for(type, name), 'state.pkl')
+
+        if not os.path.exists(file):
+            return None
+
+        return pd.read_pickle(file)
+
+    def clear(self, type, name):
+        folder = self.folder_for(type, name)
+
+        if os.path.exists(folder):
+            for file in os.listdir(folder):
+                os.remove(os.path.join(folder, file))
+
+    def read_month(self, folder, month):
+        data, encoded = pd.read_pickle(os.path.join(folder, f'{month}.pkl'))
+        return data.astype({col: object for col in encoded}) if encoded else data
+
+    def write_month(self, folder, month, data):
+        encoded = [col for col in data.columns if data[col].dtype == object]
+        pd.to_pickle((data.astype({col: 'category' for col in encoded}), encoded),
+            os.path.join(folder, f'{month}.pkl'))
+
+    def refresh(self, raw, preparer, type, full, name):
+        '''Returns the prepared data for raw, preparing only the changed days
+
+        args:
+            raw -> current raw data of the extract
+            preparer -> preparer with a prepare_chunk method
+            name -> identifies the extract (source files, fys, options)
+        '''
+        if not hasattr(preparer, 'prepare_chunk'):
+            raise Exception(f'{type} data can not be ingested incrementally')
+
+        folder = self.folder_for(type, name)
+        state = self.load(type, name) or {'watermark': None, 'days': {}}
+        watermark_column = self.watermark_columns.get(type)
+
+        days = self.row_days(raw, watermark_column)
+        codes, uniques = pd.factorize(days)
+        counts = np.bincount(codes, minlength=len(uniques))
+        open_from = self.open_from(state['watermark'])
+
+        # closed days are compared by row count, open ones by their contents
+        changed = np.zeros(len(uniques), dtype=bool)
+        digests = {}
+        hashed = 0
+
+        for i, (day, count) in enumerate(zip(uniques.tolist(), counts.tolist())):
+            stored = state['days'].get(day)
+            if stored is None or stored['rows'] != count:
+                changed[i] = True
+            elif day >= open_from or day == -1:
+                digests[day] = self.digest(raw.loc[codes == i])
+                hashed += count
+                changed[i] = digests[day] != stored['digest']
+
+        current = set(uniques.tolist())
+        dropped = [day for day in state['days'] if day not in current]
+        changed_days = set(uniques[changed].tolist()) | set(dropped)
+        rewrite = {self.month_of(day) for day in changed_days}
+
+        rows = changed[codes]
+        delta = raw.loc[rows].copy()
+        delta['_day'] = days[rows]
+        prepared = preparer.prepare_chunk(delta, full)
+        groups = dict(list(prepared.groupby(prepared['_day'].map(self.month_of), sort=False)))
+
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        months = {self.month_of(day) for day in current}
+        parts = {}
+        for month in months:
+            if month not in rewrite:
+                parts[month] = self.read_month(folder, month)
+                continue
+
+            part = groups.get(month, prepared.iloc[:0])
+            file = os.path.join(folder, f'{month}.pkl')
+            if os.path.exists(file):
+                kept = self.read_month(folder, month)
+                kept = kept.loc[~kept['_day'].isin(changed_days)]
+                part = pd.concat([kept, part], ignore_index=True) if len(kept) else part
+
+            part = part.iloc[np.argsort(part['_day'].values, kind='stable')] \
+                .reset_index(drop=True)
+            self.write_month(folder, month, part)
+            parts[month] = part
+
+        for month in {self.month_of(day) for day in state['days']} - months:
+            os.remove(os.path.join(folder, f'{month}.pkl'))
+
+        # months sort as yyyy-mm, rows without a date last
+        order = sorted(parts, key=lambda month: (month == 'none', month))
+        working = pd.concat([parts[month] for month in order], ignore_index=True) \
+            if order else prepared
+        working = working.drop(columns='_day')
+        working = restore_categoricals(working, {col: 'category'
+            for col in raw.columns if raw[col].dtype.name == 'category'})
+
+        watermark = None
+        if watermark_column in raw.columns:
+            watermark = raw[watermark_column].max()
+            watermark = None if pd.isnull(watermark) else watermark
+
+        self.stats = {
+            'rows': len(raw),
+            'prepared': len(delta),
+            'hashed': hashed,
+            'days': int(changed.sum()),
+            'dropped': len(dropped),
+            'months': len(rewrite),
+            'previous_watermark': state['watermark'],
+            'watermark': watermark
+        }
+
+        # digests of the days open on the next refresh, the new days are hashed here
+        next_open_from = self.open_from(watermark)
+        state_days = {}
+        for i, (day, count) in enumerate(zip(uniques.tolist(), counts.tolist())):
+            digest = None
+            if day >= next_open_from or day == -1:
+                digest = digests.get(day)
+                if digest is None and not changed[i]:
+                    digest = state['days'][day]['digest']
+                if digest is None:
+                    digest = self.digest(raw.loc[codes == i])
+            state_days[day] = {'rows': count, 'digest': digest}
+
+        pd.to_pickle({'watermark': watermark, 'days': state_days},
+            os.path.join(folder, 'state.pkl'))
+
+        return working
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from .cache import FrameCache
+
+
+class HashIndex:
+    '''Row positions of each value of a column, ex. summary_cust_id or fy
+
+    Rows are grouped by value once (CSR layout: positions ordered by value
+    plus the offset of each value), so the rows of k values are found in
+    O(k) instead of scanning the column. Missing values are not indexed.
+    '''
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.values = pd.Index(uniques)
+        self.order = np.argsort(codes, kind='stable')
+        self.offsets = np.searchsorted(codes[self.order], np.arange(len(uniques) + 1))
+
+    def positions(self, keys):
+        '''Sorted row positions of the rows matching any of keys'''
+        codes = self.values.get_indexer(pd.Index(list(keys)).unique())
+        slices = [self.order[self.offsets[code]:self.offsets[code + 1]]
+            for code in codes if code >= 0]
+
+        if not slices:
+            return np.array([], dtype=np.intp)
+
+        return np.sort(np.concatenate(slices))
+
+
+class SortedIndex:
+    '''Row positions of a column in sorted order, ex. perf_dt
+
+    Range lookups are two binary searches, O(log n + k). Missing values
+    (NaT) are not indexed and never match a range.
+    '''
+
+    def __init__(self, values):
+        values = np.asarray(values)
+        valid = np.flatnonzero(pd.notnull(values))
+        self.order = valid[np.argsort(values[valid], kind='stable')]
+        self.sorted = values[self.order]
+
+    def range(self, low=None, high=None, closed='both'):
+        '''Sorted row positions of low <= value <= high
+
+        args:
+            low, high -> bounds, None for unbounded
+            closed -> 'both' or 'left' (low <= value < high)
+        '''
+        start = 0 if low is None else np.searchsorted(self.sorted, self.cast(low), 'left')
+        side = 'right' if closed == 'both' else 'left'
+        end = len(self.sorted) if high is None else \
+            np.searchsorted(self.sorted, self.cast(high), side)
+        return np.sort(self.order[start:end])
+
+    def cast(self, value):
+        if np.issubdtype(self.sorted.dtype, np.datetime64):
+            return np.datetime64(pd.Timestamp(value), 'ns')
+        return value
+
+
+class DataIndex:
+    '''Indexes on a prepared dataframe, built by PSData.build_index
+
+    args:
+        partitions -> columns with few values (ex. fy), hash indexed
+        sorted -> columns indexed for range lookups (ex. perf_dt)
+        hashed -> id columns (ex. summary_cust_id), hash indexed
+    Columns missing from data are skipped
+    '''
+
+    def __init__(self, data, partitions=('fy',), sorted=('perf_dt',),
+                 hashed=('summary_cust_id',)):
+        self.indexes = {}
+
+        for col in list(partitions) + list(hashed):
+            if col in data.columns:
+                self.indexes[col] = HashIndex(data[col])
+
+        for col in sorted:
+            if col in data.columns:
+                self.indexes[col] = SortedIndex(data[col])
+
+    def get(self, column, kind):
+        index = self.indexes.get(column)
+        return index if isinstance(index, kind) else None
+
+
+# indexes of the frames indexed in this process
+frame_indexes = FrameCache()
+
+
+def attach_index(data, index):
+    '''Registers the column indexes of index as the indexes of data, until
+    data is garbage collected
+    '''
+    for column, column_index in index.indexes.items():
+        frame_indexes.put(data, column_index, columns=[column], key=column)
+
+
+def get_index(data, column, kind):
+    '''The kind (HashIndex or SortedIndex) index of column of data, or None
+
+    Indexes describe the rows of data when it was indexed, a column changed
+    in place afterwards (ex. sort_values(inplace=True)) is treated as
+    unindexed, see etl.cache.FrameCache
+    '''
+    index = frame_indexes.get(data, key=column)
+    return index if isinstance(index, kind) else None
+
+
+def positions_mask(length, positions):
+    mask = np.zeros(length, dtype=bool)
+    mask[positions] = True
+    return mask
+
+
+def index_data(data, **columns):
+    '''Builds and attaches the DataIndex of data, see DataIndex for columns'''
+    index = DataIndex(data, **columns)
+    attach_index(data, index)
+    return index
@@ -73,17 +73,18 @@ class TicketPlots:
     @staticmethod
     def returning_singles_plot(data, to_date, series=['Classics', 'Pops', 'Summer'],
                                 fys=None):
-        data = data.copy()
-
-        data = filter.filter_by_series(data=data, series=series)
-        data = filter.filter_non_subs(data=data)
-        data = filter.filter_paid_only(data=data, column='paid_amt')
-        data = filter.filter_before_date(data=data, col='perf_dt', to_date=to_date)
+        steps = [
+            (filter.filter_by_series, {'series': series}),
+            (filter.filter_non_subs, {}),
+            (filter.filter_paid_only, {'column': 'paid_amt'}),
+            (filter.filter_before_date, {'col': 'perf_dt', 'to_date': to_date})
+        ]
 
         if fys:
-            data = filter.filter_fys(data=data, fys=fys)
+            steps.append((filter.filter_fys, {'fys': fys}))
 
-        data = data[['summary_cust_id', 'perf_dt']].reset_index(drop=True)
+        mask = filter.pipeline_mask(data, steps)
+        data = filter.select(data, mask, columns=['summary_cust_id', 'perf_dt'])
         data = data.drop_duplicates().reset_index(drop=True)
 
         concerts_to_dt = transform.add_concert_number(data=data)
@@ -124,19 +125,21 @@ class TicketPlots:
 
     @staticmethod
     def plot_singles_by_zone(data, series, to_date=None, fys=None):
-        data = data.copy()
-
-        data = filter.filter_by_series(data=data, series=series)
-
-        data = filter.filter_non_subs(data=data)
-        data = filter.filter_paid_only(data=data, column='paid_amt')
+        steps = [
+            (filter.filter_by_series, {'series': series}),
+            (filter.filter_non_subs, {}),
+            (filter.filter_paid_only, {'column': 'paid_amt'})
+        ]
 
         if to_date:
             to_date = transform.date_convert(to_date)
-            data = filter.filter_before_date(data=data, col='perf_dt', to_date=to_date)
+            steps.append((filter.filter_before_date, {'col': 'perf_dt', 'to_date': to_date}))
 
         if fys:
-            data = filter.filter_fys(data=data, fys=fys)
+            steps.append((filter.filter_fys, {'fys': fys}))
+
+        mask = filter.pipeline_mask(data, steps)
+        data = filter.select(data, mask, columns=['price_zone', 'paid_amt'])
 
         data = data.groupby('price_zone').agg({'paid_amt': 'count'}).reset_index()
         data = data.loc[~data.price_zone.isin(['Price B', 'Price P'])]
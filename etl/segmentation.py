@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class BreakpointFactory:
+    '''Strategies placing the low, average and high breakpoints of a
+    segmentation input (transactions or avg_paid)
+
+    ex. BreakpointFactory('quantile', quantiles=(0.2, 0.5, 0.8)).strategy
+    '''
+
+    def __init__(self, name, **kwargs):
+        self.mapper = {
+            'midpoint': MidpointBreakpoints,
+            'quantile': QuantileBreakpoints
+        }
+
+        if name not in self.mapper:
+            options = list(self.mapper.keys())
+            raise Exception(f'{name} must match one of: {options}')
+
+        self.strategy = self.mapper[name](**kwargs)
+
+
+class MidpointBreakpoints:
+    '''low and high halfway between the mean and the min / max (the original
+    PreConcertSegmentation.segmentation_breakouts)
+    '''
+
+    def breakpoints(self, values):
+        values = np.asarray(values, dtype=float)
+        avg = values.mean()
+        return (values.min() + avg) / 2, avg, (values.max() + avg) / 2
+
+
+class QuantileBreakpoints:
+    '''low, average and high at quantiles of the values, quartiles by default'''
+
+    def __init__(self, quantiles=(0.25, 0.5, 0.75)):
+        self.quantiles = list(quantiles)
+
+    def breakpoints(self, values):
+        return tuple(np.quantile(np.asarray(values, dtype=float), self.quantiles))
+
+
+segments = np.array(['group 1', 'group 2', 'group 3', 'group 4'], dtype=object)
+
+
+def segment(transactions, avg_paid, transaction_breaks, paid_breaks):
+    '''Segment ('group 1' to 'group 4') of every customer
+
+    The rules of PreConcertSegmentation.segmentation_algo evaluated as array
+    conditions over all customers at once
+
+    args:
+        transaction_breaks, paid_breaks -> (low, avg, high) breakpoints
+    '''
+    t = np.asarray(transactions, dtype=float)
+    p = np.asarray(avg_paid, dtype=float)
+    low_t, avg_t, high_t = transaction_breaks
+    low_p, avg_p, high_p = paid_breaks
+
+    group_1 = (t > high_t) & (p > high_p)
+    group_2 = ((t > high_t) & (p >= avg_p)) | ((t >= avg_t) & (p > high_p))
+    group_3 = ((t > low_t) & (p > high_p)) | ((t >= avg_t) & (p >= avg_p)) |\
+        ((t > high_t) & (p > low_p))
+
+    codes = np.select([group_1, group_2, group_3], [0, 1, 2], 3)
+    return segments[codes]
+
+
+def segment_customers(data, breakpoints='midpoint', **kwargs):
+    '''Adds the segment of each customer to segmentation data (summary_cust_id,
+    transactions, avg_paid), breakpoints placed by the named strategy
+
+    kwargs are passed to the strategy, ex. quantiles=(0.2, 0.5, 0.8)
+    '''
+    strategy = BreakpointFactory(breakpoints, **kwargs).strategy
+    data = data.copy()
+    data['segment'] = segment(data['transactions'], data['avg_paid'],
+        strategy.breakpoints(data['transactions']), strategy.breakpoints(data['avg_paid']))
+    return data
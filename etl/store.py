@@ -0,0 +1,182 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (union_categoricals, is_extension_array_dtype,
+    is_integer_dtype)
+
+
+class ColumnStore:
+    '''On disk store of prepared data, one memory mapped .npy file per column
+
+    Each fiscal year of a data type is a partition folder. Numeric, boolean
+    and datetime columns are saved as plain arrays, string columns are
+    dictionary encoded (codes array + categories) and opened as categoricals,
+    nullable integers keep their mask. Opening a partition maps the files
+    instead of reading them, so processes share the page cache rather than
+    holding private copies. The maps are copy on write: edits of an opened
+    partition are private to the process and never reach the files. Opening
+    several fiscal years concatenates their columns (one copy, no parsing).
+
+    args:
+        directory -> folder the partitions are written to
+    '''
+
+    def __init__(self, directory=os.path.join('cache', 'store')):
+        self.directory = directory
+
+    def partition_dir(self, type, fy):
+        return os.path.join(self.directory, type, f'fy{fy}')
+
+    def meta(self, type, fy):
+        file = os.path.join(self.partition_dir(type, fy), 'meta.json')
+
+        if not os.path.exists(file):
+            return None
+
+        with open(file) as f:
+            return json.load(f)
+
+    def has(self, type, fy, key=None):
+        '''True if the partition exists (and was written from key, if given)'''
+        meta = self.meta(type, fy)
+        return meta is not None and (key is None or meta['key'] == key)
+
+    def write(self, type, fy, data, key=None):
+        '''Materializes data as the fy partition of type
+
+        args:
+            key -> identifies the source of data, see has
+        '''
+        folder = self.partition_dir(type, fy)
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+
+        columns = []
+        for num, col in enumerate(data.columns):
+            kind = self.write_column(folder, str(num), data[col])
+            columns.append({'name': col, 'file': str(num), 'kind': kind})
+
+        # meta is written last, a partition without it is incomplete
+        with open(os.path.join(folder, 'meta.json'), 'w') as f:
+            json.dump({'key': key, 'rows': len(data), 'columns': columns}, f)
+
+    def write_partitions(self, type, partitions, key=None):
+        '''Materializes {fy: data} as the complete partitioned set of type,
+        replacing any partitions of type written before
+
+        The manifest listing the fys is written last, see partitions
+        '''
+        folder = os.path.join(self.directory, type)
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+
+        for fy, data in partitions.items():
+            self.write(type, fy, data, key=key)
+
+        fys = [None if fy is None else int(fy) for fy in partitions]
+        with open(os.path.join(folder, 'manifest.json'), 'w') as f:
+            json.dump({'key': key, 'fys': fys}, f)
+
+    def partitions(self, type, key=None):
+        '''fys written by write_partitions (from key, if given), None if
+        there is no complete partitioned set
+        '''
+        file = os.path.join(self.directory, type, 'manifest.json')
+
+        if not os.path.exists(file):
+            return None
+
+        with open(file) as f:
+            manifest = json.load(f)
+
+        if key is not None and manifest['key'] != key:
+            return None
+        return manifest['fys']
+
+    @staticmethod
+    def write_column(folder, file, series):
+        path = os.path.join(folder, file)
+        dtype = series.dtype
+
+        if is_extension_array_dtype(dtype) and is_integer_dtype(dtype):
+            np.save(path + '.npy', series.values._data)
+            np.save(path + '.mask.npy', series.values._mask)
+            return dtype.name
+
+        if dtype == object or is_extension_array_dtype(dtype):
+            categorical = pd.Categorical(series)
+            np.save(path + '.codes.npy', categorical.codes)
+            pd.to_pickle(categorical.categories, path + '.categories.pkl')
+            return 'category'
+
+        # plain dtype, np.save warns on dtypes carrying metadata (ex. unpickled datetimes)
+        values = series.values
+        np.save(path + '.npy', values.view(np.dtype(values.dtype.str)))
+        return 'array'
+
+    def read(self, type, fys, columns=None):
+        '''Opens the fy partitions of type as one dataframe
+
+        args:
+            fys -> iterable of fiscal years, a single fy is opened zero-copy
+            columns -> only open these columns, None for all
+        '''
+        fys = fys if isinstance(fys, list) else [fys]
+        parts = [self.read_partition(type, fy, columns) for fy in fys]
+
+        if len(parts) == 1:
+            return parts[0]
+
+        data = {}
+        for col in parts[0]:
+            values = [part[col] for part in parts]
+            if all(value.dtype.name == 'category' for value in values):
+                data[col] = pd.Series(union_categoricals(
+                    [value.values for value in values], ignore_order=True), name=col)
+            else:
+                data[col] = pd.concat(values, ignore_index=True)
+
+        return pd.concat(data.values(), axis=1, copy=False)
+
+    def read_partition(self, type, fy, columns=None):
+        meta = self.meta(type, fy)
+
+        if meta is None:
+            raise FileNotFoundError(f'{type} fy{fy} has not been written to the store')
+
+        folder = self.partition_dir(type, fy)
+        series = []
+        for col in meta['columns']:
+            if columns is None or col['name'] in columns:
+                values = self.read_column(folder, col)
+                series.append(pd.Series(values, name=col['name'], copy=False))
+
+        return pd.concat(series, axis=1, copy=False)
+
+    @staticmethod
+    def read_column(folder, col):
+        path = os.path.join(folder, col['file'])
+
+        if col['kind'] == 'category':
+            codes = np.load(path + '.codes.npy', mmap_mode='c')
+            categories = pd.read_pickle(path + '.categories.pkl')
+            return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories))
+
+        if col['kind'] == 'array':
+            return np.load(path + '.npy', mmap_mode='c')
+
+        values = np.load(path + '.npy', mmap_mode='c')
+        mask = np.load(path + '.mask.npy', mmap_mode='c')
+        return pd.arrays.IntegerArray(values, mask)
+
+    def clear(self):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+
+# Process wide store used by PSData.open_data
+column_store = ColumnStore()
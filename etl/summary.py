@@ -0,0 +1,113 @@
+import pandas as pd
+
+from .cache import FrameCache
+
+
+class CustomerSummary:
+    '''Per customer, per fiscal year summary of prepared ticket data
+
+    Built with one pass of groupbys, then answers the customer level
+    questions (new to file, minimum concerts, segmentation inputs, current
+    subscribers) without regrouping the ticket table.
+
+    table columns (one row per summary_cust_id and fy):
+        concerts -> distinct perf_dt
+        tickets -> ticket rows
+        paid_concerts, paid_tickets, paid_amt -> the same for paid_amt > 0
+        subscriber -> bought a Subscription or Flex ticket that fy
+
+    customers holds the same totals per customer, plus first_fy and last_fy
+    '''
+    required_columns = ['summary_cust_id', 'fy', 'perf_dt', 'paid_amt', 'price_type_group']
+
+    def __init__(self, data):
+        missing = [col for col in self.required_columns if col not in data.columns]
+        if missing:
+            raise Exception(f'customer summary needs the columns: {missing}')
+
+        keys = [data['summary_cust_id'], data['fy']]
+        grouped = data.groupby(keys)
+        paid = data['paid_amt'] > 0
+        paid_grouped = data.loc[paid].groupby([key[paid] for key in keys])
+
+        table = pd.DataFrame({
+            'concerts': grouped['perf_dt'].nunique(),
+            'tickets': grouped.size(),
+            'paid_concerts': paid_grouped['perf_dt'].nunique(),
+            'paid_tickets': paid_grouped.size(),
+            'paid_amt': paid_grouped['paid_amt'].sum(),
+            'subscriber': data['price_type_group'].isin(['Subscription', 'Flex'])
+                .groupby(keys).any()
+        })
+        counts = ['paid_concerts', 'paid_tickets', 'paid_amt']
+        table[counts] = table[counts].fillna(0)
+        table = table.astype({'paid_concerts': 'int64', 'paid_tickets': 'int64'})
+        self.table = table.reset_index()
+
+        by_customer = self.table.groupby('summary_cust_id')
+        self.customers = by_customer.agg({
+            'fy': ['min', 'max'],
+            'concerts': 'sum',
+            'tickets': 'sum',
+            'paid_concerts': 'sum',
+            'paid_tickets': 'sum',
+            'paid_amt': 'sum',
+            'subscriber': 'any'
+        })
+        self.customers.columns = ['first_fy', 'last_fy', 'concerts', 'tickets',
+            'paid_concerts', 'paid_tickets', 'paid_amt', 'subscriber']
+        self.customers = self.customers.reset_index()
+
+    def new_to_file(self):
+        '''Same result as filter.filter_new_to_file on the summarized data'''
+        baseline = self.table['fy'].max()
+        new = self.customers.loc[self.customers['first_fy'] == baseline]
+        new = new[['summary_cust_id', 'concerts']].reset_index(drop=True)
+        new.columns = ['summary_cust_id', 'perf_dt']
+
+        return set(new['summary_cust_id']), new.loc[new['perf_dt'] > 1]
+
+    def minimum_concerts(self, min_lim):
+        '''Customers at min_lim or more concerts, as filter_by_minimum_transactions'''
+        data = self.customers[['summary_cust_id', 'concerts']]
+        data = data.loc[data['concerts'] >= min_lim].reset_index(drop=True)
+        data.columns = ['summary_cust_id', 'perf_dt']
+        return data
+
+    def segmentation_data(self):
+        '''Concerts and average paid per paid customer, as
+        PreConcertSegmentation.prep_segmentation_data on the paid rows
+        '''
+        data = self.customers.loc[self.customers['paid_tickets'] > 0]
+        return pd.DataFrame({
+            'summary_cust_id': data['summary_cust_id'].values,
+            'transactions': data['paid_concerts'].values,
+            'avg_paid': (data['paid_amt'] / data['paid_tickets']).values
+        })
+
+    def subscribers(self, fy):
+        '''summary_cust_id of the subscribers of fy'''
+        mask = (self.table['fy'] == fy) & self.table['subscriber']
+        return self.table.loc[mask, 'summary_cust_id'].reset_index(drop=True)
+
+
+# summaries of the frames summarized in this process
+frame_summaries = FrameCache()
+
+
+def customer_summary(data):
+    '''The CustomerSummary of data, built on the first call per frame'''
+    summary = frame_summaries.get(data)
+
+    if summary is None:
+        summary = CustomerSummary(data)
+        frame_summaries.put(data, summary, columns=CustomerSummary.required_columns)
+
+    return summary
+
+
+def get_summary(data):
+    '''The CustomerSummary of data if one was built and its columns were not
+    changed since (see etl.cache.FrameCache), else None
+    '''
+    return frame_summaries.get(data)
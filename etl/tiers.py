@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+
+class TierBins:
+    '''A tier mapper compiled to sorted bin edges, ex. donor_tier_mapper
+
+    mapper is {label: (low, high)} with inclusive bounds, high can be
+    math.inf. Tiers are sorted by low once, then whole arrays of amounts are
+    assigned with one searchsorted instead of scanning the mapper per amount.
+
+    Amounts are rounded to decimals first (cents by default, None to keep
+    them as they are). Amounts between two tiers (ex. 99.995 with (1.0, 99.99)
+    and (100.0, 299.99) when not rounded) are handled per gaps:
+        'lower' -> tier below the gap, tiers behave as [low, next low)
+        'nan' -> no tier
+        'raise' -> raise an Exception
+    Amounts below the first tier or above a finite last tier get no tier
+    ('raise' raises). Amounts without a tier are NaN (the labels are then
+    returned as floats).
+    '''
+    gap_options = ['lower', 'nan', 'raise']
+
+    def __init__(self, mapper, gaps='lower', decimals=2):
+        if gaps not in self.gap_options:
+            raise Exception(f'{gaps} must match one of: {self.gap_options}')
+
+        tiers = sorted(((float(low), float(high), int(label))
+            for label, (low, high) in mapper.items()), key=lambda tier: tier[0])
+
+        for (low, high, label), (next_low, _, next_label) in zip(tiers, tiers[1:]):
+            if next_low <= high:
+                raise Exception(f'tiers {label} and {next_label} overlap')
+
+        self.lows = np.array([tier[0] for tier in tiers])
+        self.highs = np.array([tier[1] for tier in tiers])
+        self.labels = np.array([tier[2] for tier in tiers])
+        self.gaps = gaps
+        self.decimals = decimals
+
+    def assign(self, amounts):
+        '''Tier label of each amount, see the class docstring for gaps'''
+        amounts = np.asarray(amounts, dtype=float)
+        if self.decimals is not None:
+            amounts = np.round(amounts, self.decimals)
+        positions = np.searchsorted(self.lows, amounts, side='right') - 1
+
+        below = positions < 0
+        positions = np.where(below, 0, positions)
+        above = amounts > self.highs[positions]
+        beyond = above & (positions == len(self.lows) - 1)
+        gap = above & ~beyond
+        missing = below | beyond | np.isnan(amounts)
+
+        if self.gaps == 'nan':
+            missing |= gap
+
+        if self.gaps == 'raise' and (missing | gap).any():
+            examples = list(pd.unique(amounts[missing | gap])[:5])
+            raise Exception(f'amounts without a tier, ex. {examples}')
+
+        labels = self.labels[positions]
+        if missing.any():
+            labels = np.where(missing, np.nan, labels)
+        return labels
+
+
+# tier mappers compiled in this process, keyed by their items and options
+compiled_tiers = {}
+
+
+def tier_bins(mapper, gaps='lower', decimals=2):
+    '''The TierBins of mapper, compiled on the first call per mapper'''
+    key = (tuple(sorted((str(label), tuple(bounds)) for label, bounds in mapper.items())),
+        gaps, decimals)
+
+    if key not in compiled_tiers:
+        compiled_tiers[key] = TierBins(mapper, gaps=gaps, decimals=decimals)
+
+    return compiled_tiers[key]
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import datetime as dt
 
@@ -19,8 +20,31 @@ def date_convert(obj):
         raise ValueError(f"There is a problem with {obj}")
 
 
+def parse_dates(values, format=None):
+    '''Vectorized date parsing with a fallback for malformed entries
+
+    The whole column is parsed with a single format (repeated strings are
+    only parsed once). Only the unique values that fail are sent through
+    date_convert, e.g. '11/18/2013 15:31:18:733' becomes '11/18/2013'
+
+    Args:
+    values -- array-like of date strings (can be passed as read_csv date_parser)
+    format -- strftime format of the well formed values
+              ex. '%m/%d/%Y %H:%M:%S'
+    '''
+    values = pd.Series(values)
+    parsed = pd.to_datetime(values, format=format, errors='coerce', cache=True)
+
+    failed = parsed.isnull() & values.notnull()
+    if failed.any():
+        fixed = {value: date_convert(value) for value in values[failed].unique()}
+        parsed[failed] = pd.to_datetime(values[failed].map(fixed))
+
+    return parsed
+
+
 def add_dow(pd_series):
-    return pd_series.transform(lambda x: x.strftime("%A"))
+    return pd_series.dt.day_name()
 
 
 def convert_to_fy(date_obj):
@@ -33,6 +57,167 @@ def convert_to_fy(date_obj):
     return year + 1
 
 
+def convert_to_fys(dates):
+    '''Vectorized convert_to_fy for a series of datetimes'''
+    return dates.dt.year % 100 + (dates.dt.month >= 7)
+
+
+def extract_fys(values, patterns):
+    '''Vectorized fiscal year parsing of descriptions with str.extract
+
+    Each unique value is matched once, patterns are tried in order
+
+    Args:
+    values -- pd.Series of strings, ex. season_desc 'PS 18-19 Classics'
+    patterns -- list of (regex, offset). The regex captures the two digit
+                year and offset is added to it, ex. (r'-(\\d{2})', 0)
+
+    Returns a float series, NaN where no pattern matched
+    '''
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    fys = pd.Series(np.nan, index=uniques.index)
+
+    for pattern, offset in patterns:
+        missing = fys.isnull()
+        if not missing.any():
+            break
+        found = uniques[missing].str.extract(pattern, expand=False)
+        fys[missing] = pd.to_numeric(found) + offset
+
+    mapped = np.append(fys.values, np.nan)[codes]
+    return pd.Series(mapped, index=values.index, name=values.name)
+
+
+def is_narrow_integer(kind):
+    '''True for integer dtypes (numpy or nullable) narrower than 64 bits'''
+    if kind is None or not pd.api.types.is_integer_dtype(kind):
+        return False
+    return np.dtype(pd.api.types.pandas_dtype(kind).type).itemsize < 8
+
+
+def read_dtype(dtype):
+    '''dtype to pass to pd.read_csv for a schema with narrow integers
+
+    read_csv silently wraps values out of range of a narrow integer dtype
+    (40000 read as int16 is -25536), so these columns are read at 64 bits
+    (Int64 for nullable ids) and narrowed by narrow_integers
+    '''
+    if not dtype:
+        return dtype
+
+    def wide(kind):
+        if not is_narrow_integer(kind):
+            return kind
+        nullable = isinstance(pd.api.types.pandas_dtype(kind), pd.api.extensions.ExtensionDtype)
+        return 'Int64' if nullable else np.dtype('int64')
+
+    return {col: wide(kind) for col, kind in dtype.items()}
+
+
+def narrow_integers(data, dtype, type):
+    '''Converts the columns of data to the narrow integer dtypes of dtype
+
+    Columns with values out of range of their dtype keep their width and are
+    reported
+
+    Args:
+    dtype -- {column: dtype}, only the narrow integer columns are converted
+    type -- data type, used in the report
+    '''
+    narrowed = {}
+
+    for col, kind in (dtype or {}).items():
+        if col not in data.columns or not is_narrow_integer(kind) or \
+                data[col].dtype == kind:
+            continue
+
+        values = data[col].dropna()
+        bounds = np.iinfo(pd.api.types.pandas_dtype(kind).type)
+        if len(values) and (values.min() < bounds.min or values.max() > bounds.max):
+            print(f'{type}: kept {col} as {data[col].dtype}, values '
+                  f'{values.min()} to {values.max()} are out of range of {kind}')
+            continue
+
+        narrowed[col] = kind
+
+    return data.astype(narrowed) if narrowed else data
+
+
+def map_unique(values, func, cache=None):
+    '''Maps func over a series, calling it once per unique value
+
+    Categoricals are mapped once per category. Missing values stay missing
+
+    Args:
+    values -- pd.Series to map
+    func -- function of a single (non missing) value
+    cache -- dict of value -> result kept between calls, default: None
+    '''
+    cache = {} if cache is None else cache
+
+    def lookup(value):
+        if value not in cache:
+            cache[value] = func(value)
+        return cache[value]
+
+    if values.dtype.name == 'category':
+        return values.map({value: lookup(value) for value in values.cat.categories})
+
+    codes, uniques = pd.factorize(values)
+    results = [lookup(value) for value in uniques]
+
+    missing = codes == -1
+    if missing.any():
+        codes = np.where(missing, len(results), codes)
+        results.append(np.nan)
+
+    mapped = pd.Series(results, dtype=object).infer_objects().take(codes)
+    return pd.Series(mapped.values, index=values.index, name=values.name)
+
+
+class TransformRegistry:
+    '''Named scalar transforms, evaluated once per unique value
+
+    Any function of a single value (or a mapping dict) registered here is
+    applied with map_unique: once per distinct value, or per category of a
+    categorical, and broadcast back to the rows. Results are cached per
+    transform across calls in this process, so values seen before are not
+    evaluated again.
+
+    args:
+        max_entries -> cached results per transform before its cache is
+                       cleared, bounds memory on high cardinality columns
+    '''
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.transforms = {}
+        self.results = {}
+
+    def register(self, name, func):
+        '''func is a function of one value or a dict (unmapped values -> NaN)'''
+        if isinstance(func, dict):
+            mapper = func
+            func = lambda value: mapper.get(value, np.nan)
+
+        self.transforms[name] = func
+        self.results[name] = {}
+        return func
+
+    def apply(self, name, values):
+        if name not in self.transforms:
+            raise Exception(f'{name} must match one of: {list(self.transforms.keys())}')
+
+        if len(self.results[name]) > self.max_entries:
+            self.results[name] = {}
+
+        return map_unique(values, self.transforms[name], cache=self.results[name])
+
+    def clear(self):
+        self.results = {name: {} for name in self.transforms}
+
+
 def add_concert_number(data):
     data = data.copy()
     concert_mapper_datetime = {pd.to_datetime(k): v for k,v in concert_mapper_fy20.items()}
@@ -51,7 +236,7 @@ def add_concert_number(data):
 
 def transform_price_type_group(data):
     data = data.copy()
-    data['price_type_group'] = data['price_type_group'].map(price_type_group_mapper)
+    data['price_type_group'] = transforms.apply('price_type_group', data['price_type_group'])
     return data
 
 
@@ -61,3 +246,10 @@ def donor_convert_cont_dt_to_monday(date):
     if date < pd.to_datetime('7/1/2019'):
         date = pd.to_datetime('7/1/2019')
     return date - dt.timedelta(date.weekday())
+
+
+# Process wide registry, see TransformRegistry. The ticket preparer registers
+# its zone and series mappers in etl.data_prep
+transforms = TransformRegistry()
+transforms.register('price_type_group', price_type_group_mapper)
+transforms.register('date_convert', date_convert)
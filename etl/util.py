@@ -1,4 +1,33 @@
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def parallel_map(func, items, workers=None, executor='thread'):
+    '''Maps func over items, returning results in the order of items
+
+    args:
+        workers -> size of the pool. None or 1 runs serially in this process
+        executor -> 'thread' or 'process'. Processes parse in true parallel
+                    but results are pickled back and aren't memoized here
+    '''
+    pools = {
+        'thread': ThreadPoolExecutor,
+        'process': ProcessPoolExecutor
+    }
+
+    if executor not in pools:
+        options = list(pools.keys())
+        raise Exception(f'{executor} must match one of: {options}')
+
+    items = list(items)
+
+    if not workers or workers == 1 or len(items) < 2:
+        return [func(item) for item in items]
+
+    with pools[executor](max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
 
 def clear_cwd_cache():
     dirs_to_skip = ['.git', 'venv']
@@ -14,6 +43,6 @@ def clear_cwd_cache():
             for file in files:
                 os.remove(f"{root}/{file}")
             for dir in dirs:
-                os.remove(f"{root}/{dir}")
+                shutil.rmtree(f"{root}/{dir}")
 
     print('cache is now empty')
@@ -0,0 +1,79 @@
+import unittest
+
+import pandas as pd
+
+from etl import aggregator, filter
+from tests.setup_tests import SetupTests
+
+
+class TestAggregator(unittest.TestCase):
+    def setUp(self):
+        self.setup = SetupTests()
+        self.setup.prep_test_data()
+        self.tdata = self.setup.ticket.working
+
+    def tearDown(self):
+        pass
+
+    def test_stream_data(self):
+        chunks = self.setup.ticket.stream_data(fys=[19, 20],
+            path=self.setup.fp_ticket, chunksize=250)
+        streamed = pd.concat(chunks, ignore_index=True)
+        self.assertTrue(streamed.equals(self.tdata))
+
+    def test_chunked_aggregator(self):
+        chunks = self.setup.ticket.stream_data(fys=[19, 20],
+            path=self.setup.fp_ticket, chunksize=250)
+        paid = filter.filter_chunks(chunks, filter.filter_paid_only, column='paid_amt')
+
+        agg = {'paid_amt': ['sum', 'mean', 'max'], 'perf_dt': 'nunique'}
+        grp = ['summary_cust_id', 'fy']
+        chunked = aggregator.chunked_aggregator(paid, grp, agg)
+        expected = aggregator.complex_aggregator(
+            filter.filter_paid_only(self.tdata, 'paid_amt'), grp, agg)
+
+        pd.testing.assert_frame_equal(chunked, expected)
+
+        empty = aggregator.chunked_aggregator(iter([]), grp, agg)
+        self.assertEqual(list(empty.columns), list(expected.columns))
+        self.assertEqual(len(empty), 0)
+
+    def test_latest_aggregator(self):
+        ddata = self.setup.donor.working
+
+        # get_solicitor_info before vectorization
+        data = ddata.sort_values('trn_dt', ascending=False)
+        expected = {}
+        for sid, pssol in zip(data['summary_cust_id'], data['ps_sol']):
+            expected.setdefault(sid, pssol)
+
+        latest = aggregator.latest_aggregator(ddata, 'summary_cust_id', 'ps_sol', 'trn_dt')
+        self.assertEqual(len(latest), len(expected))
+        self.assertTrue(latest['summary_cust_id'].is_monotonic_increasing)
+        pd.testing.assert_series_equal(latest.set_index('summary_cust_id')['ps_sol'],
+            pd.Series(expected, name='ps_sol').rename_axis('summary_cust_id').sort_index())
+
+        # cached per frame, callers get their own copy
+        latest['ps_sol'] = None
+        cached = self.setup.donor.latest_values('ps_sol', 'trn_dt')
+        self.assertEqual(list(cached['ps_sol'].fillna('')), list(pd.Series(
+            [expected[sid] for sid in cached['summary_cust_id']]).fillna('')))
+        self.assertIsNotNone(aggregator.frame_latest.get(ddata,
+            key=('summary_cust_id', ('ps_sol',), 'trn_dt')))
+
+        # an in place edit of the same length is picked up
+        newest = ddata['trn_dt'].idxmax()
+        ddata.loc[newest, 'ps_sol'] = 'New Solicitor'
+        latest = self.setup.donor.latest_values('ps_sol', 'trn_dt').set_index('summary_cust_id')
+        self.assertEqual(latest.loc[ddata.loc[newest, 'summary_cust_id'], 'ps_sol'],
+            'New Solicitor')
+
+    def test_latest_aggregator_ties(self):
+        data = pd.DataFrame({
+            'summary_cust_id': [1, 1, 2, 2, None],
+            'trn_dt': pd.to_datetime(['2019-01-01', '2019-01-01', None, '2018-01-01', '2020-01-01']),
+            'channel_desc': ['a', 'b', 'c', 'd', 'e']
+        })
+        latest = aggregator.latest_aggregator(data, 'summary_cust_id', ['channel_desc'],
+            'trn_dt', ['summary_cust_id', 'channel'])
+        self.assertEqual(list(latest['channel']), ['b', 'd'])
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pandas.api.types import is_datetime64_any_dtype
+
+from etl.cache import WorkingCache
+from etl.exception import UnexpectedCacheFormat
+from tests.setup_tests import SetupTests
+
+
+class TestWorkingCache(unittest.TestCase):
+    def setUp(self):
+        self.setup = SetupTests()
+        self.setup.prep_test_data()
+        self.tdata = self.setup.ticket.working
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_pickle_round_trip(self):
+        cache = WorkingCache(directory=self.directory)
+        key = cache.build_key(type='ticket', full=True, version=1, fys=[19, 20])
+        self.assertIsNone(cache.read('ticket', key))
+
+        data = self.tdata.astype({'price_zone': 'category'})
+        cache.write('ticket', key, data)
+        self.assertTrue(os.path.exists(cache.file_for('ticket', key)))
+
+        cached = cache.read('ticket', key)
+        self.assertTrue(cached.equals(data))
+        self.assertTrue((cached.dtypes == data.dtypes).all())
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_csv_fallback(self):
+        cache = WorkingCache(directory=self.directory, format='csv')
+        key = cache.build_key(type='ticket', full=True, version=1, data=self.tdata)
+        cache.write('ticket', key, self.tdata)
+
+        cached = cache.read('ticket', key)
+        self.assertEqual(len(cached), len(self.tdata))
+        self.assertTrue(is_datetime64_any_dtype(cached['perf_dt']))
+
+    def test_set_format(self):
+        cache = WorkingCache(directory=self.directory)
+
+        with self.assertRaises(UnexpectedCacheFormat):
+            cache.set_format('bad_format')
+
+    def test_build_key(self):
+        source = os.path.join(self.directory, 'fy20_all.csv')
+        with open(source, 'w') as f:
+            f.write('a,b\n1,2\n')
+
+        key = WorkingCache.build_key('ticket', True, 1, files=[source], fys=20)
+        self.assertEqual(key, WorkingCache.build_key('ticket', True, 1,
+            files=[source], fys=[20]))
+        self.assertNotEqual(key, WorkingCache.build_key('ticket', False, 1,
+            files=[source], fys=20))
+        self.assertNotEqual(key, WorkingCache.build_key('ticket', True, 2,
+            files=[source], fys=20))
+
+        with open(source, 'a') as f:
+            f.write('3,4\n')
+
+        self.assertNotEqual(key, WorkingCache.build_key('ticket', True, 1,
+            files=[source], fys=20))
+
+    def test_evict(self):
+        cache = WorkingCache(directory=self.directory)
+        keys = [cache.build_key('ticket', True, 1, fys=fy) for fy in [18, 19, 20]]
+
+        for key in keys:
+            cache.write('ticket', key, self.tdata)
+            os.utime(cache.file_for('ticket', key), (0, len(cache.entries())))
+
+        size = os.path.getsize(cache.file_for('ticket', keys[0]))
+        cache.max_bytes = size * 2
+        cache.evict()
+
+        self.assertIsNone(cache.read('ticket', keys[0]))
+        self.assertIsNotNone(cache.read('ticket', keys[2]))
+        self.assertEqual(cache.stats['evictions'], 1)
@@ -4,6 +4,7 @@ import unittest
 from etl.data_import import (ImportData, TicketImportStrategy,
     DonorImportStrategy, SubscriberImportStrategy, ModeOfSaleImportStrategy)
 from etl.helpers import ticketing_dtype, donor_dtype
+from etl.cache import DatasetMemo, dataset_memo
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -44,6 +45,44 @@ class TestImportData(unittest.TestCase):
             path=self.fp_mode_of_sale)
         self.assertEqual(len(mosdata), 26)
 
+    def test_send_data_memoized(self):
+        dataset_memo.clear()
+        tdata19 = self.importer.send_data(type='ticket', fys=19,
+            path=self.fp_ticket)
+        tdata19['paid_amt'] = 0
+
+        hits = dataset_memo.stats['hits']
+        tdata_all = self.importer.send_data(type='ticket', fys=[19, 20],
+            path=self.fp_ticket)
+        self.assertEqual(dataset_memo.stats['hits'], hits + 1)
+        self.assertTrue(tdata_all['paid_amt'].sum() > 0)
+
+    def test_memo_eviction(self):
+        memo = DatasetMemo(max_bytes=None)
+        file = os.path.join(self.fp_ticket, 'fy19_all.csv')
+        data = TicketImportStrategy().import_file(fy=19, path=self.fp_ticket)
+
+        memo.put(memo.build_key('ticket', file, skiprows=3), data)
+        memo.put(memo.build_key('ticket', file, skiprows=4), data)
+        memo.max_bytes = memo.nbytes - 1
+        memo.put(memo.build_key('ticket', file, skiprows=5), data)
+
+        self.assertIsNone(memo.get(memo.build_key('ticket', file, skiprows=3)))
+        self.assertIsNone(memo.get(memo.build_key('ticket', file, skiprows=4)))
+        self.assertIsNotNone(memo.get(memo.build_key('ticket', file, skiprows=5)))
+        self.assertEqual(memo.stats['evictions'], 2)
+
+    def test_memo_oversized(self):
+        memo = DatasetMemo(max_bytes=1000)
+        file = os.path.join(self.fp_ticket, 'fy19_all.csv')
+        data = TicketImportStrategy().import_file(fy=19, path=self.fp_ticket)
+
+        self.assertFalse(memo.put(memo.build_key('ticket', file), data))
+        self.assertIsNone(memo.get(memo.build_key('ticket', file)))
+        self.assertEqual(len(memo.entries), 0)
+        self.assertEqual(memo.nbytes, 0)
+        self.assertEqual(memo.stats['oversized'], 1)
+
 class TestTicketImportStrategy(unittest.TestCase):
     def setUp(self):
         self.ticket = TicketImportStrategy()
@@ -62,6 +101,17 @@ class TestTicketImportStrategy(unittest.TestCase):
         all = self.ticket.get_data(fys=[19, 20], path=self.fp, dtype=ticketing_dtype)
         self.assertEqual(len(all), 1800)
 
+    def test_get_data_parallel(self):
+        serial = self.ticket.get_data(fys=[20, 19], path=self.fp, dtype=ticketing_dtype)
+
+        for executor in ['thread', 'process']:
+            parallel = self.ticket.get_data(fys=[20, 19], path=self.fp,
+                dtype=ticketing_dtype, workers=2, executor=executor)
+            self.assertTrue(parallel.equals(serial))
+
+        with self.assertRaisesRegex(Exception, r"must match one of: \['thread', 'process'\]"):
+            self.ticket.get_data(fys=[20, 19], path=self.fp, workers=2, executor='fork')
+
     def test_import_data(self):
         t20 = self.ticket.import_file(fy=20, dtype=ticketing_dtype, path=self.fp)
         self.assertEqual(len(t20), 1000)
@@ -109,3 +159,7 @@ class TestModeOfSaleImportStrategy(unittest.TestCase):
     def test_get_data(self):
         data = self.mos.get_data(fys=20, path=self.fp, qtr=1)
         self.assertEqual(len(data), 26)
+
+    def test_get_data_no_files(self):
+        with self.assertRaisesRegex(FileNotFoundError, r'fys \[15\]'):
+            self.mos.get_data(fys=15, path=self.fp)
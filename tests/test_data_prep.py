@@ -1,5 +1,8 @@
 import unittest
 import datetime as dt
+import pandas as pd
+from etl import transform
+from etl.helpers import fy_dtype
 from etl.data_prep import PrepDataFactory, PrepTicketData
 from tests.setup_tests import SetupTests
 
@@ -23,3 +26,15 @@ class TestDataPrep(unittest.TestCase):
 
         self.assertTrue(isinstance(prepared_data['perf_dt'][0], dt.date))
         self.assertTrue(isinstance(prepared_data['order_dt'][0], dt.date))
+
+    def test_prep_tickets_matches_row_wise(self):
+        prep = PrepTicketData()
+        prepared_data = prep.prepare_chunk(self.tdata.copy(), full=False)
+
+        expected = self.tdata.copy()
+        expected['dow'] = expected['perf_dt'].transform(lambda x: x.strftime("%A"))
+        expected['series'] = expected['season_desc'].transform(lambda x: x.split(" ")[-1])
+        expected['fy'] = expected['perf_dt'].map(transform.convert_to_fy).astype(fy_dtype)
+        expected['price_zone'] = expected['zone_desc'].map(prep.zone_mapper)
+
+        pd.testing.assert_frame_equal(prepared_data, expected)
@@ -1,9 +1,14 @@
 import os
+import shutil
+import tempfile
 import unittest
 
+import pandas as pd
+
 from etl.data_type import (DataFactory, PSData, Ticket, Donor, Subscriber,
     ModeOfSale, Attribute)
 from etl.exception import UnexpectedDataType
+from etl.cache import working_cache
 
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -73,3 +78,131 @@ class TestPSData(unittest.TestCase):
 
         self.attribute.get_data(fys=None, path=self.fp_attribute)
         self.assertEqual(len(self.attribute.raw), 4)
+
+    def test_get_data_mode_of_sale_periods(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = path + '/'
+            for period in ['q1_20', 'q2_20', 'q1_21']:
+                shutil.copy(os.path.join(self.fp_mode_of_sale, 'q1_20.CSV'),
+                    f'{path}{period}.csv')
+
+            self.mode_of_sale.get_data(fys=[20, 21], path=path, workers=2)
+            self.assertEqual(len(self.mode_of_sale.raw), 78)
+
+            working = self.mode_of_sale.working
+            self.assertEqual(list(working[['fy', 'qtr']].drop_duplicates()
+                .itertuples(index=False, name=None)), [(20, 1), (20, 2), (21, 1)])
+
+            raw = self.mode_of_sale.raw
+            self.assertEqual(list(working['season']),
+                [season.split(' ')[2] for season in raw['season']])
+            self.assertFalse(working['mos_desc'].str.contains('OC').any())
+
+            # cached quarters are reused, only the new one is prepared
+            shutil.copy(f'{path}q1_20.csv', f'{path}q3_20.csv')
+            misses = working_cache.stats['misses']
+            self.mode_of_sale.get_data(fys=[(20, 1), (20, 2), (20, 3)], path=path)
+            self.assertEqual(len(self.mode_of_sale.working), 78)
+            self.assertEqual(working_cache.stats['misses'], misses + 1)
+
+    def test_get_data_mode_of_sale_string_fys(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = path + '/'
+            shutil.copy(os.path.join(self.fp_mode_of_sale, 'q1_20.CSV'), f'{path}q1_20.csv')
+
+            self.mode_of_sale.get_data(fys='20', path=path, qtr='1')
+            self.assertEqual(len(self.mode_of_sale.raw), 26)
+            working = self.mode_of_sale.working
+            self.assertGreater(len(working), 0)
+
+            # the cached partition is the prepared one
+            self.mode_of_sale.get_data(fys=20, path=path, qtr=1)
+            pd.testing.assert_frame_equal(self.mode_of_sale.working, working)
+
+            # rows outside the partitions are not cached as empty partitions
+            raw = self.mode_of_sale.raw
+            with self.assertRaisesRegex(Exception, 'match none of the partitions'):
+                self.mode_of_sale.prep_partitions(raw,
+                    {('20', 1): {'files': [f'{path}q1_20.csv']}}, by=['fy', 'qtr'])
+
+    def test_get_data_lazy(self):
+        self.subscriber.get_data(fys=20, path=self.fp_subscriber)
+        self.assertFalse(self.subscriber.is_loaded('working'))
+        self.assertFalse(self.subscriber.is_loaded('raw_prior'))
+
+        working = self.subscriber.working
+        self.assertIs(self.subscriber.working, working)
+        self.assertFalse(self.subscriber.is_loaded('raw_prior'))
+
+        self.assertEqual(len(self.subscriber.raw_prior), 58)
+        self.assertEqual(set(self.subscriber.working_prior.fy), {19})
+
+        # loading new data invalidates the memoized data
+        self.subscriber.get_data(fys=[19, 20], path=self.fp_subscriber)
+        self.assertFalse(self.subscriber.is_loaded('working'))
+        self.assertIsNone(self.subscriber.raw_prior)
+
+    def test_get_data_lazy_failure(self):
+        self.subscriber.get_data(fys=20, path=self.fp_subscriber)
+        calls = []
+
+        def load_working():
+            calls.append(1)
+            raise ValueError('prep failed')
+
+        self.subscriber._loaders['working'] = load_working
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.subscriber.working
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(self.subscriber.is_loaded('working'))
+
+    def test_get_data_release_raw(self):
+        self.ticket.get_data(fys=20, path=self.fp_ticket, release_raw=True)
+        self.assertEqual(len(self.ticket.raw), 1000)
+
+        self.assertGreater(len(self.ticket.working), 0)
+        self.assertIsNone(self.ticket.raw)
+
+    def test_apply_filters(self):
+        self.ticket.get_data(fys=[19, 20], path=self.fp_ticket)
+        filters = self.ticket.type.filters
+
+        chained = filters['series'](data=self.ticket.working, series=['Classics', 'Pops'])
+        chained = filters['non_subs'](data=chained)
+        chained = filters['paid'](data=chained, column='paid_amt')
+
+        filtered = self.ticket.apply_filters([
+            ('series', {'series': ['Classics', 'Pops']}),
+            'non_subs',
+            ('paid', {'column': 'paid_amt'})
+        ], columns=['summary_cust_id', 'paid_amt'])
+
+        self.assertGreater(len(filtered), 0)
+        self.assertTrue(filtered.equals(chained[['summary_cust_id', 'paid_amt']]))
+
+        with self.assertRaises(Exception):
+            self.ticket.apply_filters(['bad_filter'])
+
+    def test_get_data_columns(self):
+        self.ticket.get_data(fys=20, path=self.fp_ticket)
+        projected = PSData(Ticket)
+        projected.get_data(fys=20, path=self.fp_ticket, columns=['paid_amt', 'fy'])
+
+        columns = ['perf_dt', 'zone_desc', 'paid_amt', 'season_desc',
+                   'summary_cust_id', 'dow', 'series', 'fy', 'price_zone']
+        self.assertEqual(list(projected.working.columns), columns)
+        self.assertTrue(projected.working.equals(self.ticket.working[columns]))
+
+    def test_get_data_compact(self):
+        self.ticket.get_data(fys=[19, 20], path=self.fp_ticket)
+        full_size = self.ticket.memory_report()['bytes'].sum()
+
+        compact = PSData(Ticket)
+        compact.get_data(fys=[19, 20], path=self.fp_ticket, compact=True)
+        report = compact.memory_report().set_index('column')
+
+        self.assertEqual(len(compact.working), len(self.ticket.working))
+        self.assertEqual(report.loc['zone_desc', 'dtype'], 'category')
+        self.assertEqual(report.loc['summary_cust_id', 'dtype'], 'Int32')
+        self.assertLess(report['bytes'].sum(), full_size)
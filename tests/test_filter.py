@@ -0,0 +1,61 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from etl import filter
+from etl.data_type import PSData, Ticket
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestFilter(unittest.TestCase):
+    def setUp(self):
+        ticket = PSData(Ticket)
+        ticket.get_data(fys=[19, 20], path=os.path.join(THIS_DIR, 'test_data/ticket/'))
+        self.data = ticket.working
+        self.to_date = pd.Timestamp('2020-03-01')
+
+    def test_select_matches_chained_filters(self):
+        before = self.data.copy()
+
+        chained = filter.filter_by_series(data=self.data, series=['Classics', 'Pops'])
+        chained = filter.filter_non_subs(data=chained)
+        chained = filter.filter_paid_only(data=chained, column='paid_amt')
+        chained = filter.filter_before_date(data=chained, col='perf_dt', to_date=self.to_date)
+
+        in_series = filter.series_mask(self.data, ['Classics', 'Pops'])
+        selected = filter.select(self.data, in_series,
+            filter.non_subs_mask(self.data, within=in_series),
+            filter.paid_mask(self.data, 'paid_amt'),
+            filter.before_date_mask(self.data, 'perf_dt', self.to_date))
+
+        self.assertGreater(len(selected), 0)
+        pd.testing.assert_frame_equal(selected, chained)
+        pd.testing.assert_frame_equal(self.data, before)
+
+    def test_select_positions_and_columns(self):
+        paid = filter.paid_mask(self.data, 'paid_amt')
+        positions = np.arange(0, len(self.data), 2)
+        selected = filter.select(self.data, paid, positions, columns=['fy', 'paid_amt'])
+
+        expected = self.data.iloc[positions]
+        expected = expected.loc[expected.paid_amt > 0, ['fy', 'paid_amt']]
+        pd.testing.assert_frame_equal(selected, expected.reset_index(drop=True))
+
+    def test_pipeline_mask(self):
+        chained = filter.filter_fys(data=self.data, fys=[20])
+        chained = filter.filter_subs(data=chained)
+        chained = filter.filter_paid_only(data=chained, column='paid_amt')
+
+        mask = filter.pipeline_mask(self.data, [
+            (filter.filter_fys, {'fys': [20]}),
+            (filter.filter_subs, {}),
+            (filter.filter_paid_only, {'column': 'paid_amt'})
+        ])
+        self.assertGreater(mask.sum(), 0)
+        pd.testing.assert_frame_equal(filter.select(self.data, mask), chained)
+
+        with self.assertRaises(Exception):
+            filter.pipeline_mask(self.data, [(filter.filter_new_to_file, {})])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from etl.data_type import PSData, Ticket
+from etl.incremental import IncrementalIngest
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestIncrementalIngest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fp = self.directory + '/'
+
+        with open(os.path.join(THIS_DIR, 'test_data/ticket/fy20_all.csv')) as f:
+            self.lines = f.readlines()
+
+        ticket = PSData(Ticket)
+        ticket.get_data(fys=20, path=os.path.join(THIS_DIR, 'test_data/ticket/'))
+        self.days = ticket.raw['order_dt'].dt.floor('D')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_extract(self, rows):
+        with open(os.path.join(self.directory, 'fy20_all.csv'), 'w') as f:
+            f.writelines(self.lines[:4] + [self.lines[4 + row] for row in rows])
+
+    def get_data(self, incremental):
+        ticket = PSData(Ticket)
+        ticket.ingest = IncrementalIngest(directory=os.path.join(self.directory, 'state'))
+        ticket.get_data(fys=20, path=self.fp, incremental=incremental)
+        ticket.working  # prepared (and ingested) on first access
+        return ticket
+
+    @staticmethod
+    def by_day(data):
+        '''rows ordered as refresh returns them'''
+        days = data['order_dt'].dt.floor('D')
+        order = pd.DataFrame({'nat': days.isnull(), 'day': days}).sort_values(
+            ['nat', 'day'], kind='mergesort').index
+        return data.loc[order].reset_index(drop=True)
+
+    def test_refresh(self):
+        cutoff = pd.Timestamp('2019-09-29')
+        before = [row for row, day in enumerate(self.days) if not day >= cutoff]
+        self.write_extract(before)
+        first = self.get_data(incremental=True)
+        self.assertEqual(first.ingest.stats['prepared'], len(before))
+
+        # two days later: new sales appended and one recent order changed
+        rows = list(range(len(self.days)))
+        recent = [row for row in before if self.days[row] == pd.Timestamp('2019-09-27')
+            and 'Sold' in self.lines[4 + row]][0]
+        self.lines[4 + recent] = self.lines[4 + recent].replace('Sold', 'Returned', 1)
+        self.write_extract(rows)
+
+        refreshed = self.get_data(incremental=True)
+        expected = self.get_data(incremental=False)
+        stats = refreshed.ingest.stats
+
+        # only the new days and the changed day are prepared, only the open
+        # days (a week before the watermark and rows without a date) are hashed
+        new = len(rows) - len(before)
+        self.assertEqual(stats['prepared'], new + (self.days == self.days[recent]).sum())
+        self.assertEqual(stats['hashed'], (self.days.isnull() |
+            (self.days >= pd.Timestamp('2019-09-20')) & (self.days < cutoff)).sum())
+        self.assertLess(stats['prepared'], len(rows) / 2)
+        self.assertLess(stats['hashed'], len(rows) / 4)
+        self.assertEqual(stats['months'], 1)
+        pd.testing.assert_frame_equal(refreshed.working, self.by_day(expected.working))
+
+        # nothing new, nothing prepared
+        unchanged = self.get_data(incremental=True)
+        self.assertEqual(unchanged.ingest.stats['prepared'], 0)
+        pd.testing.assert_frame_equal(unchanged.working, refreshed.working)
+
+        # a day removed from the extract is dropped
+        last = self.days == self.days.max()
+        self.write_extract([row for row in rows if not last[row]])
+        removed = self.get_data(incremental=True)
+        self.assertEqual(removed.ingest.stats['dropped'], 1)
+        self.assertEqual(removed.ingest.stats['prepared'], 0)
+        expected = self.get_data(incremental=False)
+        pd.testing.assert_frame_equal(removed.working, self.by_day(expected.working))
@@ -0,0 +1,128 @@
+import gc
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from etl import filter, cache
+from etl import index as data_index
+from etl.analysis import PreConcertSegmentation
+from etl.data_type import PSData, Ticket
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestDataIndex(unittest.TestCase):
+    def setUp(self):
+        self.ticket = PSData(Ticket)
+        self.ticket.get_data(fys=[19, 20], path=os.path.join(THIS_DIR, 'test_data/ticket/'),
+            index=True)
+        self.data = self.ticket.working
+        self.plain = self.data.copy()  # same rows, not indexed
+
+    def test_index_built(self):
+        self.assertIsNotNone(data_index.get_index(self.data, 'fy', data_index.HashIndex))
+        self.assertIsNotNone(data_index.get_index(self.data, 'perf_dt', data_index.SortedIndex))
+        self.assertIsNone(data_index.get_index(self.plain, 'fy', data_index.HashIndex))
+
+    def test_lookups(self):
+        ids = list(self.data['summary_cust_id'].drop_duplicates()[:5]) + [-1]
+        positions = data_index.get_index(self.data, 'summary_cust_id',
+            data_index.HashIndex).positions(ids)
+        expected = np.flatnonzero(self.data['summary_cust_id'].isin(ids))
+        np.testing.assert_array_equal(positions, expected)
+
+        perf_dt = self.data['perf_dt'].sort_values()
+        low, high = perf_dt.iloc[100], perf_dt.iloc[500]
+        positions = data_index.get_index(self.data, 'perf_dt',
+            data_index.SortedIndex).range(low, high)
+        expected = np.flatnonzero((self.data['perf_dt'] >= low) & (self.data['perf_dt'] <= high))
+        np.testing.assert_array_equal(positions, expected)
+
+    def test_filters_use_index(self):
+        to_date = self.data['perf_dt'].median()
+        ids = list(self.data['summary_cust_id'].drop_duplicates()[:20])
+
+        for frame in (self.data, self.plain):
+            pd.testing.assert_frame_equal(filter.filter_fys(frame, [20]),
+                filter.filter_fys(self.plain, [20]))
+            pd.testing.assert_frame_equal(filter.filter_customers(frame, ids),
+                filter.filter_customers(self.plain, ids))
+            pd.testing.assert_frame_equal(filter.filter_subs(frame),
+                filter.filter_subs(self.plain))
+            pd.testing.assert_frame_equal(
+                filter.filter_before_date(frame, 'perf_dt', to_date),
+                filter.filter_before_date(self.plain, 'perf_dt', to_date))
+
+    def test_concert_by_date(self):
+        date = self.data['perf_dt'].iloc[0].strftime('%Y-%m-%d')
+        indexed = PreConcertSegmentation(self.data, None, 20, [date])
+        plain = PreConcertSegmentation(self.plain, None, 20, [date])
+
+        concert = indexed.get_concert_by_date(date)
+        self.assertGreater(len(concert), 0)
+        pd.testing.assert_frame_equal(concert, plain.get_concert_by_date(date))
+
+    def test_concerts(self):
+        days = self.data['perf_dt'].dt.normalize().drop_duplicates()
+        dates = [days.iloc[2], days.iloc[0], '1999-01-01', days.iloc[2] + pd.Timedelta(hours=20)]
+
+        for data in [self.data, self.plain]:
+            segmentation = PreConcertSegmentation(data, None, 20, dates)
+            concerts = list(segmentation.get_concerts(dates))
+            self.assertEqual(len(concerts), 4)
+            self.assertEqual(len(concerts[2]), 0)
+
+            for concert, date in zip(concerts, dates):
+                pd.testing.assert_frame_equal(concert, segmentation.get_concert_by_date(date))
+
+            # every concert is a view of the single season copy
+            self.assertTrue(np.shares_memory(concerts[0]['paid_amt'].values,
+                concerts[3]['paid_amt'].values))
+
+    def test_index_invalidated_in_place(self):
+        frame = self.plain.copy()
+        data_index.index_data(frame)
+
+        frame.sort_values('paid_amt', inplace=True)
+        frame.reset_index(drop=True, inplace=True)
+        self.assertIsNone(data_index.get_index(frame, 'fy', data_index.HashIndex))
+
+        filtered = filter.filter_fys(frame, [20])
+        self.assertEqual(set(filtered['fy']), {20})
+        self.assertEqual(len(filtered), (frame['fy'] == 20).sum())
+
+        data_index.index_data(frame)
+        frame.loc[0, 'fy'] = 19 if frame.loc[0, 'fy'] == 20 else 20
+        self.assertIsNone(data_index.get_index(frame, 'fy', data_index.HashIndex))
+        self.assertIsNotNone(data_index.get_index(frame, 'perf_dt', data_index.SortedIndex))
+        self.assertEqual(len(filter.filter_fys(frame, [20])), (frame['fy'] == 20).sum())
+
+    def test_index_lookup_cost(self):
+        frame = self.plain.copy()
+        data_index.index_data(frame)
+
+        # lookups of an unedited frame do not scan the column again
+        with mock.patch('etl.cache.column_fingerprint',
+                        wraps=cache.column_fingerprint) as fingerprint:
+            for _ in range(3):
+                self.assertIsNotNone(data_index.get_index(frame, 'fy', data_index.HashIndex))
+            self.assertEqual(fingerprint.call_count, 0)
+
+            # an edit elsewhere in the frame is checked once, then O(1) again
+            frame.loc[0, 'paid_amt'] = 1.0
+            for _ in range(3):
+                self.assertIsNotNone(data_index.get_index(frame, 'fy', data_index.HashIndex))
+            self.assertEqual(fingerprint.call_count, 1)
+
+    def test_index_dropped_with_frame(self):
+        frame = self.plain.copy()
+        data_index.index_data(frame)
+        key = id(frame)
+        self.assertIn(key, data_index.frame_indexes.entries)
+
+        del frame
+        gc.collect()
+        self.assertNotIn(key, data_index.frame_indexes.entries)
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from etl import segmentation
+from etl.analysis import PreConcertSegmentation
+
+
+def segment_row_wise(data):
+    '''PreConcertSegmentation segmentation before vectorization'''
+    _, low_t, avg_t, high_t, _ = PreConcertSegmentation.segmentation_breakouts(data, 'transactions')
+    _, low_p, avg_p, high_p, _ = PreConcertSegmentation.segmentation_breakouts(data, 'avg_paid')
+    return PreConcertSegmentation.get_segmentation(data, PreConcertSegmentation.segmentation_algo,
+        low_t, avg_t, high_t, low_p, avg_p, high_p)
+
+
+class TestSegmentation(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = pd.DataFrame({
+            'summary_cust_id': np.arange(5000),
+            'transactions': rng.geometric(0.3, 5000),
+            'avg_paid': np.round(rng.lognormal(4, 1, 5000), 2)
+        })
+
+    def test_midpoint_matches_row_wise(self):
+        segmented = segmentation.segment_customers(self.data)
+        pd.testing.assert_frame_equal(segmented, segment_row_wise(self.data))
+        self.assertEqual(set(segmented['segment']), {'group 2', 'group 3', 'group 4'})
+        self.assertNotIn('segment', self.data.columns)
+
+    def test_quantile(self):
+        strategy = segmentation.BreakpointFactory('quantile', quantiles=(0.1, 0.5, 0.9)).strategy
+        low, avg, high = strategy.breakpoints(self.data['avg_paid'])
+        self.assertAlmostEqual(avg, self.data['avg_paid'].median())
+
+        segmented = segmentation.segment_customers(self.data, 'quantile')
+        top = (self.data['transactions'] > self.data['transactions'].quantile(0.75)) &\
+            (self.data['avg_paid'] > self.data['avg_paid'].quantile(0.75))
+        self.assertTrue((segmented.loc[top, 'segment'] == 'group 1').all())
+
+        with self.assertRaises(Exception):
+            segmentation.segment_customers(self.data, 'bad')
+
+    def test_prep_segmentation_data(self):
+        tickets = pd.DataFrame({
+            'summary_cust_id': [1, 1, 1, 2],
+            'perf_dt': pd.to_datetime(['2019-10-01', '2019-10-01', '2019-11-01', '2019-10-01']),
+            'paid_amt': [10.0, 20.0, 60.0, 5.0]
+        })
+        data = PreConcertSegmentation.prep_segmentation_data(tickets)
+        self.assertEqual(list(data['transactions']), [2, 1])
+        self.assertEqual(list(data['avg_paid']), [30.0, 5.0])
@@ -0,0 +1,200 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from etl.data_type import PSData, Ticket, Donor
+from etl.data_import import DonorImportStrategy, select_columns
+from etl.data_prep import PrepDonorData
+from etl.analysis import TierAnalysis
+from etl.store import ColumnStore
+from etl.helpers import fy_dtype, donor_dtype, compact_donor_dtype
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def is_memory_mapped(values):
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ColumnStore(directory=self.directory)
+        self.fp = os.path.join(THIS_DIR, 'test_data/ticket/')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        data = pd.DataFrame({
+            'num': [1.5, 2.5, np.nan],
+            'count': np.array([1, 2, 3], dtype='int16'),
+            'dt': pd.to_datetime(['2019-01-01', '2019-06-01', None]),
+            'name': ['a', None, 'b'],
+            'id': pd.array([10, None, 12], dtype='Int64')
+        })
+        self.store.write('ticket', 20, data, key='abc')
+
+        self.assertTrue(self.store.has('ticket', 20))
+        self.assertTrue(self.store.has('ticket', 20, key='abc'))
+        self.assertFalse(self.store.has('ticket', 20, key='other'))
+        self.assertFalse(self.store.has('ticket', 19))
+
+        result = self.store.read('ticket', 20)
+        self.assertEqual(result['name'].dtype.name, 'category')
+        pd.testing.assert_frame_equal(result.astype({'name': object}), data)
+
+        result = self.store.read('ticket', 20, columns=['num', 'id'])
+        self.assertEqual(list(result.columns), ['num', 'id'])
+
+    def test_read_is_memory_mapped(self):
+        data = pd.DataFrame({'num': np.arange(100.0), 'name': ['a', 'b'] * 50})
+        self.store.write('ticket', 20, data)
+        result = self.store.read('ticket', 20)
+
+        self.assertTrue(is_memory_mapped(result['num'].values))
+        self.assertTrue(is_memory_mapped(result['name'].values.codes))
+
+    def test_read_missing_partition(self):
+        with self.assertRaises(FileNotFoundError):
+            self.store.read('ticket', 20)
+
+    def test_open_data(self):
+        ticket = PSData(Ticket)
+        ticket.get_data(fys=[19, 20], path=self.fp)
+
+        opened = PSData(Ticket)
+        opened.open_data(fys=[19, 20], path=self.fp, store=self.store)
+        self.assertIsNone(opened.raw)
+        self.assertTrue(self.store.has('ticket', 19))
+        self.assertTrue(self.store.has('ticket', 20))
+
+        strings = {col: object for col in opened.working.columns
+            if opened.working[col].dtype.name == 'category'}
+        pd.testing.assert_frame_equal(opened.working.astype(strings), ticket.working)
+
+        # partitions are reused as long as the source files do not change
+        partition = self.store.partition_dir('ticket', 20)
+        written = os.stat(os.path.join(partition, 'meta.json')).st_mtime_ns
+        opened.open_data(fys=20, path=self.fp, store=self.store, columns=['fy', 'dow'])
+        self.assertEqual(list(opened.working.columns), ['dow', 'fy'])
+        self.assertEqual(written, os.stat(os.path.join(partition, 'meta.json')).st_mtime_ns)
+
+    def test_open_data_in_place(self):
+        opened = PSData(Ticket)
+        opened.open_data(fys=20, path=self.fp, store=self.store)
+        working = opened.working
+        paid_amt = working.loc[0, 'paid_amt']
+        self.assertEqual(working['zone_desc'].dtype.name, 'category')
+
+        # edits are copy on write, the store keeps the prepared values
+        working.loc[0, 'paid_amt'] = paid_amt + 1
+        self.assertEqual(working.loc[0, 'paid_amt'], paid_amt + 1)
+        self.assertEqual(self.store.read('ticket', 20).loc[0, 'paid_amt'], paid_amt)
+
+        with self.assertRaises((ValueError, TypeError)):
+            working.loc[0, 'zone_desc'] = 'not a zone'
+        working['zone_desc'] = working['zone_desc'].astype(object)
+        working.loc[0, 'zone_desc'] = 'not a zone'
+        self.assertEqual(working.loc[0, 'zone_desc'], 'not a zone')
+
+    def test_open_data_donor(self):
+        donor = PSData(Donor)
+        donor.open_data(fys=13, path=os.path.join(THIS_DIR, 'test_data/donor/'),
+            store=self.store)
+        self.assertTrue(self.store.has('donor', 13))
+        self.assertEqual(donor.working['fy'].dtype, fy_dtype)
+
+    def test_write_partitions(self):
+        partitions = {19: pd.DataFrame({'num': [1.0]}), None: pd.DataFrame({'num': [2.0]})}
+        self.assertIsNone(self.store.partitions('donor_fy13'))
+
+        self.store.write_partitions('donor_fy13', partitions, key='abc')
+        self.assertEqual(self.store.partitions('donor_fy13'), [19, None])
+        self.assertIsNone(self.store.partitions('donor_fy13', key='other'))
+        self.assertEqual(list(self.store.read('donor_fy13', [None, 19])['num']), [2.0, 1.0])
+
+
+class TestDonorPartitions(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ColumnStore(directory=self.directory)
+        self.strategy = DonorImportStrategy()
+        self.fp = os.path.join(THIS_DIR, 'test_data/donor/')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_partition_once(self):
+        fys = self.strategy.partition(13, path=self.fp, store=self.store)
+        self.assertEqual(fys, list(range(13, 24)) + [None])
+
+        manifest = os.path.join(self.directory, 'donor_fy13', 'manifest.json')
+        written = os.stat(manifest).st_mtime_ns
+        self.assertEqual(self.strategy.partition(13, path=self.fp, store=self.store), fys)
+        self.assertEqual(written, os.stat(manifest).st_mtime_ns)
+
+    def test_read_partitions(self):
+        for dtype in [donor_dtype, compact_donor_dtype]:
+            extract = self.strategy.get_data(fys=13, path=self.fp, dtype=dtype)
+            pruned = self.strategy.get_data(fys=13, path=self.fp, dtype=dtype,
+                select_fys=[19, 20], store=self.store)
+
+            in_fys = extract['campaign'].astype(str).str[6:8].isin(['19', '20'])
+            expected = extract.loc[in_fys].reset_index(drop=True)
+            self.assertGreater(len(pruned), 0)
+            pd.testing.assert_frame_equal(
+                pruned.sort_values(['trn_dt', 'ref_no']).reset_index(drop=True),
+                expected.sort_values(['trn_dt', 'ref_no']).reset_index(drop=True),
+                check_categorical=False)
+
+        columns = select_columns(['summary_cust_id', 'gift_plus_pledge'])
+        pruned = self.strategy.get_data(fys=13, path=self.fp, columns=columns,
+            select_fys=[5], store=self.store)
+        self.assertEqual(list(pruned.columns), ['gift_plus_pledge', 'summary_cust_id'])
+        self.assertEqual(len(pruned), 0)
+
+    def test_partition_key(self):
+        self.strategy.partition(13, path=self.fp, store=self.store)
+
+        # changing the fy parsing partitions the extract again
+        with mock.patch.object(PrepDonorData, 'fy_patterns', [(r'^.{6}(\d{2})', 1)]):
+            fys = self.strategy.partition(13, path=self.fp, store=self.store)
+        self.assertEqual(fys, list(range(14, 25)) + [None])
+
+    def test_read_partitions_empty(self):
+        path = os.path.join(self.directory, 'extract') + os.sep
+        os.makedirs(path)
+        with open(os.path.join(self.fp, 'donors_fy13-present.csv'), encoding='ISO-8859-1') as f:
+            header = f.readline()
+        with open(os.path.join(path, 'donors_fy13-present.csv'), 'w') as f:
+            f.write(header)
+
+        store = ColumnStore(directory=os.path.join(self.directory, 'store'))
+        self.assertEqual(self.strategy.partition(13, path=path, store=store), [None])
+        pruned = self.strategy.get_data(fys=13, path=path, dtype=donor_dtype,
+            select_fys=[19], store=store)
+        self.assertEqual(len(pruned), 0)
+        self.assertIn('campaign', pruned.columns)
+
+        with mock.patch.object(store, 'partitions', return_value=[]):
+            with self.assertRaisesRegex(Exception, 'no donor partitions stored'):
+                self.strategy.get_data(fys=13, path=path, select_fys=[19], store=store)
+
+    def test_get_data_select_fys(self):
+        donor = PSData(Donor)
+        donor.get_data(fys=13, path=self.fp)
+        pruned = PSData(Donor)
+        pruned.get_data(fys=13, path=self.fp, select_fys=TierAnalysis.donor_fys(20))
+
+        self.assertEqual(set(pruned.working['fy']), {19, 20})
+        self.assertEqual(len(pruned.working), donor.working['fy'].isin([19, 20]).sum())
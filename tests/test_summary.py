@@ -0,0 +1,62 @@
+import os
+import unittest
+
+import pandas as pd
+
+from etl import filter
+from etl.analysis import PreConcertSegmentation
+from etl.data_type import PSData, Ticket
+from etl.summary import get_summary
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestCustomerSummary(unittest.TestCase):
+    def setUp(self):
+        ticket = PSData(Ticket)
+        ticket.get_data(fys=[19, 20], path=os.path.join(THIS_DIR, 'test_data/ticket/'))
+        self.plain = ticket.working.copy()
+        self.data = ticket.working
+        self.summary = ticket.customer_summary()
+
+    def test_built_once(self):
+        self.assertIs(get_summary(self.data), self.summary)
+        self.assertIsNone(get_summary(self.plain))
+
+    def test_new_to_file(self):
+        new, retained = filter.filter_new_to_file(self.data)
+        expected_new, expected_retained = filter.filter_new_to_file(self.plain)
+
+        self.assertEqual(new, expected_new)
+        pd.testing.assert_frame_equal(retained, expected_retained)
+
+    def test_summary_invalidated_in_place(self):
+        # same length, different customers: the summary no longer applies
+        self.data['summary_cust_id'] = self.data['summary_cust_id'].iloc[::-1].values
+        self.data.loc[self.data['fy'] == 20, 'paid_amt'] = 0
+        self.assertIsNone(get_summary(self.data))
+
+        plain = self.data.copy()
+        self.assertEqual(filter.filter_new_to_file(self.data)[0],
+            filter.filter_new_to_file(plain)[0])
+        pd.testing.assert_frame_equal(
+            filter.filter_by_minimum_transactions(self.data, 'summary_cust_id', 'perf_dt', 2),
+            filter.filter_by_minimum_transactions(plain, 'summary_cust_id', 'perf_dt', 2))
+
+    def test_minimum_transactions(self):
+        result = filter.filter_by_minimum_transactions(self.data, 'summary_cust_id',
+            'perf_dt', 2)
+        expected = filter.filter_by_minimum_transactions(self.plain, 'summary_cust_id',
+            'perf_dt', 2)
+        self.assertGreater(len(result), 0)
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_segmentation(self):
+        paid = filter.filter_paid_only(self.plain, 'paid_amt')
+        expected = PreConcertSegmentation.prep_segmentation_data(paid)
+        pd.testing.assert_frame_equal(self.summary.segmentation_data(), expected)
+
+        with_summary = PreConcertSegmentation(self.data, None, 20, [])
+        without = PreConcertSegmentation(self.plain, None, 20, [])
+        self.assertEqual(set(with_summary.get_current_subs()['summary_cust_id']),
+            set(without.get_current_subs()['summary_cust_id']))
@@ -0,0 +1,86 @@
+import os
+import math
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from etl.tiers import TierBins, tier_bins
+from etl.helpers import donor_tier_mapper
+from etl.analysis import TierAnalysis
+from etl.data_type import PSData, Donor
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def categorize_row_wise(amounts, mapper):
+    '''TierAnalysis.categorize_donors before vectorization'''
+    return [[int(key) for key, val in mapper.items() if val[0] <= round(amount, 2) <= val[1]][0]
+        for amount in amounts]
+
+
+class TestTierBins(unittest.TestCase):
+    def test_matches_row_wise(self):
+        rng = np.random.default_rng(0)
+        amounts = np.round(np.exp(rng.uniform(0, 13, 10000)), 2)
+        amounts = np.concatenate([amounts[amounts >= 1],
+            [1.0, 99.99, 100.0, 4999.99, 5000.0, 100000.0, 1e9]])
+
+        labels = tier_bins(donor_tier_mapper).assign(amounts)
+        self.assertEqual(labels.dtype, np.int64)
+        self.assertEqual(list(labels), categorize_row_wise(amounts, donor_tier_mapper))
+
+    def test_gaps(self):
+        amounts = [99.995, 100.0, 0.5, np.nan, 1e9]
+
+        lower = TierBins(donor_tier_mapper, decimals=None).assign(amounts)
+        np.testing.assert_array_equal(lower, [1, 2, np.nan, np.nan, 12])
+
+        skipped = TierBins(donor_tier_mapper, gaps='nan', decimals=None).assign(amounts)
+        np.testing.assert_array_equal(skipped, [np.nan, 2, np.nan, np.nan, 12])
+
+        with self.assertRaises(Exception):
+            TierBins(donor_tier_mapper, gaps='raise', decimals=None).assign([99.995])
+
+        bounded = TierBins({'1': (0, 10), '2': (20, 30)}).assign([5, 15, 35])
+        np.testing.assert_array_equal(bounded, [1, 1, np.nan])
+
+    def test_compile(self):
+        mapper = {'2': (100.0, math.inf), '1': (0.0, 99.99)}
+        self.assertIs(tier_bins(mapper), tier_bins(dict(mapper)))
+        np.testing.assert_array_equal(tier_bins(mapper).lows, [0.0, 100.0])
+
+        with self.assertRaises(Exception):
+            TierBins({'1': (0, 10), '2': (10, 20)})
+
+        with self.assertRaises(Exception):
+            TierBins(donor_tier_mapper, gaps='bad')
+
+
+class TestTierMigration(unittest.TestCase):
+    def setUp(self):
+        donor = PSData(Donor)
+        donor.get_data(fys=13, path=os.path.join(THIS_DIR, 'test_data/donor/'))
+        self.data = donor.working
+
+    def test_history_matches_execute(self):
+        analysis = TierAnalysis()
+        history = analysis.execute_history(self.data, fys=list(range(16, 21)))
+        self.assertEqual(sorted(history['fy'].unique()), [17, 18, 19, 20])
+
+        for fy in [17, 20]:
+            single = TierAnalysis()
+            single.execute(self.data, fy)
+
+            counts = analysis.history_counts.loc[analysis.history_counts['fy'] == fy]
+            pd.testing.assert_frame_equal(counts.drop(columns='fy').reset_index(drop=True),
+                single.tier_counts, check_dtype=False)
+            revenue = analysis.history_revenue.loc[analysis.history_revenue['fy'] == fy]
+            pd.testing.assert_frame_equal(revenue.drop(columns='fy').reset_index(drop=True),
+                single.tier_revenue, check_dtype=False)
+
+            in_fy = history.loc[history['fy'] == fy].set_index('classification')
+            matrix = analysis.transition_matrix(fy)
+            self.assertEqual(in_fy.loc['lost', 'count'], matrix[TierAnalysis.no_tier].sum())
+            self.assertEqual(in_fy.loc['new', 'count'], matrix.loc[TierAnalysis.no_tier].sum())
+            self.assertEqual(in_fy['count'].sum(), matrix.values.sum())
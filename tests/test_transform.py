@@ -1,6 +1,12 @@
+import io
 import unittest
 import datetime as dt
+
+import numpy as np
+import pandas as pd
+
 from etl import transform
+from etl.data_prep import PrepSubscriberData
 
 class TestTransform(unittest.TestCase):
     def setUp(self):
@@ -15,3 +21,86 @@ class TestTransform(unittest.TestCase):
 
         conv2 = transform.date_convert('November 5, 2013')
         self.assertIsInstance(conv2, dt.date)
+
+    def test_parse_dates(self):
+        values = ['4/17/2013 00:00:00', '4/20/2013 15:47:48',
+                  '11/18/2013 15:31:18:733', '4/20/2013 15:47:48', None]
+        parsed = transform.parse_dates(values, format='%m/%d/%Y %H:%M:%S')
+
+        self.assertEqual(parsed[1], dt.datetime(2013, 4, 20, 15, 47, 48))
+        self.assertEqual(parsed[2], dt.datetime(2013, 11, 18))
+        self.assertTrue(parsed[4] is pd.NaT)
+
+    def test_map_unique(self):
+        calls = []
+        def upper(value):
+            calls.append(value)
+            return value.upper()
+
+        values = pd.Series(['a', 'b', None, 'a', 'b'], name='letters')
+        mapped = transform.map_unique(values, upper)
+
+        self.assertEqual(list(mapped[[0, 1, 3, 4]]), ['A', 'B', 'A', 'B'])
+        self.assertTrue(pd.isnull(mapped[2]))
+        self.assertEqual(mapped.name, 'letters')
+        self.assertEqual(sorted(calls), ['a', 'b'])
+
+    def test_extract_fys(self):
+        values = pd.Series(['PS 18-19 Classics', 'PS 2019 Summer', 'PS Restricted',
+                            None, 'PS 18-19 Classics'])
+        fys = transform.extract_fys(values, PrepSubscriberData.fy_patterns)
+
+        self.assertEqual(list(fys[[0, 1, 4]]), [19, 20, 19])
+        self.assertTrue(fys[[2, 3]].isnull().all())
+
+    def test_transform_registry(self):
+        calls = []
+        def upper(value):
+            calls.append(value)
+            return value.upper()
+
+        registry = transform.TransformRegistry()
+        registry.register('upper', upper)
+        registry.register('mapped', {'a': 1, 'b': 2})
+
+        values = pd.Series(['a', 'b', None, 'a'])
+        self.assertEqual(list(registry.apply('upper', values)[[0, 1, 3]]), ['A', 'B', 'A'])
+        self.assertTrue(pd.isnull(registry.apply('upper', values)[2]))
+
+        # cached across calls and per category of categoricals
+        categories = pd.Series(['b', 'c', 'c'], dtype='category')
+        mapped = registry.apply('upper', categories)
+        self.assertEqual(list(mapped), ['B', 'C', 'C'])
+        self.assertEqual(mapped.dtype.name, 'category')
+        self.assertEqual(calls, ['a', 'b', 'c'])
+
+        mapped = registry.apply('mapped', pd.Series(['b', 'a', 'z']))
+        self.assertEqual(list(mapped[:2]), [2, 1])
+        self.assertTrue(pd.isnull(mapped[2]))
+
+        dates = transform.transforms.apply('date_convert', pd.Series(['11/18/2013', '11/18/2013']))
+        self.assertEqual(dates.dtype, 'datetime64[ns]')
+
+    def test_convert_to_fys(self):
+        dates = pd.Series(pd.to_datetime(['2019-06-30', '2019-07-01', '2020-01-15']))
+        expected = [transform.convert_to_fy(date) for date in dates]
+        self.assertEqual(list(transform.convert_to_fys(dates)), expected)
+
+    def test_narrow_integers(self):
+        dtype = {'seat': np.int16, 'seat_status': np.int8, 'customer_no': 'Int32',
+                 'section': 'category'}
+        source = 'seat,seat_status,customer_no,section\n40000,1,,A\n12,2,7,B\n'
+        read = transform.read_dtype(dtype)
+        self.assertEqual(read['seat'], np.int64)
+        self.assertEqual(read['customer_no'], 'Int64')
+        self.assertEqual(read['section'], 'category')
+
+        data = pd.read_csv(io.StringIO(source), dtype=read)
+        data = transform.narrow_integers(data, dtype, 'ticket')
+
+        # out of range values are kept wide instead of wrapping
+        self.assertEqual(list(data.seat), [40000, 12])
+        self.assertEqual(data.seat.dtype, np.int64)
+        self.assertEqual(data.seat_status.dtype, np.int8)
+        self.assertEqual(data.customer_no.dtype, 'Int32')
+        self.assertTrue(pd.isnull(data.customer_no[0]))